@@ -0,0 +1,96 @@
+"""
+Benchmark of the MongoDB decoding paths used by load_data.
+
+Compares three ways of turning a full collection scan into a DataFrame:
+ - documents: list(collection.find()) -> pd.DataFrame -> drop _id (the old path)
+ - projected: the same, but with a projection on the used columns
+ - columnar:  raw BSON batches decoded into Arrow columns by pymongoarrow
+
+Each run happens in a fresh process, so the peak RSS reported is the memory
+used by that decoding path alone.
+
+Usage:
+    python bench_columnar_decode.py --uri mongodb://localhost:27017 --database IND320
+"""
+
+import argparse
+import multiprocessing
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+MODES = ["documents", "projected", "columnar"]
+
+
+def _max_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return rss / 2**20 if sys.platform == "darwin" else rss / 2**10
+
+
+def _run(mode, uri, database, namespace):
+    """Decode the whole collection with one of the paths, in the current process."""
+    from pymongo import MongoClient
+    import load_data
+
+    client = MongoClient(uri)
+    collection = client[database][namespace]
+    fields = load_data._energy_fields(namespace)
+    client.admin.command("ping")
+    rss_before = _max_rss_mb()
+
+    start = time.perf_counter()
+    if mode == "documents":
+        df = load_data._documents_to_frame(collection, {})
+    elif mode == "projected":
+        df = load_data._find_frame(collection, {}, fields, columnar=False)
+    else:
+        if load_data.find_arrow_all is None:
+            raise RuntimeError("pymongoarrow is not installed")
+        df = load_data._find_frame(collection, {}, fields, columnar=True)
+    elapsed = time.perf_counter() - start
+
+    rows = len(df)
+    frame_mb = df.memory_usage(deep=True).sum() / 2**20
+    client.close()
+    return {
+        "mode": mode,
+        "rows": rows,
+        "seconds": elapsed,
+        "peak_rss_mb": _max_rss_mb() - rss_before,
+        "frame_mb": frame_mb,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uri", default="mongodb://localhost:27017")
+    parser.add_argument("--database", default="IND320")
+    parser.add_argument("--collection", default="production_NO1")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    results = {mode: [] for mode in args.modes}
+    for _ in range(args.repeat):
+        for mode in args.modes:
+            # A new worker per run, so peak RSS does not carry over between runs
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                results[mode].append(pool.submit(_run, mode, args.uri, args.database, args.collection).result())
+
+    print(f"{'mode':<10} {'rows':>10} {'best s':>9} {'peak RSS MB':>12} {'frame MB':>9}")
+    baseline = None
+    for mode, runs in results.items():
+        best = min(runs, key=lambda r: r["seconds"])
+        peak = max(r["peak_rss_mb"] for r in runs)
+        baseline = baseline or (best["seconds"], peak)
+        print(
+            f"{mode:<10} {best['rows']:>10} {best['seconds']:>9.3f} {peak:>12.1f} {best['frame_mb']:>9.1f}"
+            f"   ({baseline[0] / best['seconds']:.1f}x time, {baseline[1] / max(peak, 1e-9):.1f}x memory)"
+        )
+
+
+if __name__ == "__main__":
+    main()
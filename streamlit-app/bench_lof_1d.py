@@ -0,0 +1,65 @@
+"""
+Benchmark of the 1-D Local Outlier Factor against sklearn.
+
+Runs the precipitation anomaly detection of the outlier page on hourly data
+for a city over a range of years, once with
+LocalOutlierFactor(n_neighbors, contamination).fit_predict (the old path) and
+once with lof_1d.lof_fit_predict, and reports the time of both, the number of
+outliers each finds and how many labels agree.
+
+Usage:
+    python bench_lof_1d.py --city Oslo --start 2018 --end 2024
+"""
+
+import argparse
+import time
+
+import numpy as np
+from sklearn.neighbors import LocalOutlierFactor
+
+from load_data import CITIES, load_data_from_meteo_range
+from lof_1d import lof_fit_predict
+
+
+def _best_time(function, repeat):
+    """Result of function() and the fastest of repeat runs, in seconds."""
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--city", choices=list(CITIES), default="Oslo")
+    parser.add_argument("--start", type=int, required=True)
+    parser.add_argument("--end", type=int, required=True)
+    parser.add_argument("--column", default="precipitation")
+    parser.add_argument("--neighbors", type=int, default=20)
+    parser.add_argument("--contamination", type=float, default=0.01)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    x = load_data_from_meteo_range(args.start, args.end, args.city)[args.column].to_numpy(dtype=float)
+
+    def sklearn_labels():
+        return LocalOutlierFactor(n_neighbors=args.neighbors, contamination=args.contamination).fit_predict(x.reshape(-1, 1))
+
+    def lof_1d_labels():
+        return lof_fit_predict(x, args.neighbors, args.contamination)[0]
+
+    sk_labels, sk_seconds = _best_time(sklearn_labels, args.repeat)
+    fast_labels, fast_seconds = _best_time(lof_1d_labels, args.repeat)
+
+    differ = int((sk_labels != fast_labels).sum())
+    print(f"{args.city} {args.start}-{args.end}, {len(x)} hours of {args.column}")
+    print(f"{'method':<8} {'best s':>9} {'outliers':>9}")
+    print(f"{'sklearn':<8} {sk_seconds:>9.3f} {int((sk_labels == -1).sum()):>9}")
+    print(f"{'lof_1d':<8} {fast_seconds:>9.3f} {int((fast_labels == -1).sum()):>9}   ({sk_seconds / fast_seconds:.1f}x)")
+    print(f"Labels agree for {len(x) - differ} of {len(x)} hours ({differ} differ)")
+
+
+if __name__ == "__main__":
+    main()
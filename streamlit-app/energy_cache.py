@@ -0,0 +1,174 @@
+"""
+Local Parquet cache for the energy collections in MongoDB.
+
+Rows are stored on disk partitioned by namespace/group/month, e.g.
+.energy_cache/production_NO1/hydro/2021-03.parquet
+Next to the partitions a manifest.json records which date ranges have already
+been fetched, so a query only has to go to MongoDB for the days that are missing.
+
+Elhub revises hours for months after they happen, and ingest_elhub rewrites
+them in MongoDB. The caller therefore passes the last day that no ingest run
+rewrites any more (last_final), and the time of the latest backfill. Later days
+are never treated as cached: they are fetched again on every query and merged
+over the stored rows. A backfill may rewrite any month, so when it is newer than
+the one recorded in the manifest every cached range is fetched again.
+"""
+
+import json
+import os
+import threading
+from datetime import date, timedelta
+from pathlib import Path
+
+import pandas as pd
+
+CACHE_DIR = Path(__file__).resolve().parent / ".energy_cache"
+
+# Columns that identify one hourly record within a namespace/group
+KEY_COLUMNS = ["pricearea", "starttime"]
+
+_lock = threading.Lock()
+
+
+def _group_dir(namespace, group):
+    return CACHE_DIR / namespace / group
+
+
+def _month_path(namespace, group, period):
+    return _group_dir(namespace, group) / f"{period}.parquet"
+
+
+def _atomic_write(path, write):
+    """Write to a temporary file next to path and move it into place."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def _stamp(backfilled):
+    return backfilled.isoformat() if backfilled is not None else None
+
+
+def read_manifest(namespace, group, backfilled=None):
+    """
+    Return the date ranges already on disk for namespace/group
+    as a sorted list of (start, end) date tuples, both ends inclusive.
+    Ranges recorded before the given backfill time are no longer valid.
+    """
+    path = _group_dir(namespace, group) / "manifest.json"
+    if not path.exists():
+        return []
+    with open(path, "r") as f:
+        manifest = json.load(f)
+    if manifest.get("backfilled") != _stamp(backfilled):
+        return []
+    return [(date.fromisoformat(s), date.fromisoformat(e)) for s, e in manifest["ranges"]]
+
+
+def _merge_ranges(ranges):
+    """Merge overlapping or adjacent inclusive date ranges."""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + timedelta(days=1):
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _write_manifest(namespace, group, ranges, backfilled):
+    path = _group_dir(namespace, group) / "manifest.json"
+    payload = {
+        "backfilled": _stamp(backfilled),
+        "ranges": [[s.isoformat(), e.isoformat()] for s, e in _merge_ranges(ranges)],
+    }
+
+    def write(tmp):
+        with open(tmp, "w") as f:
+            json.dump(payload, f, indent=2)
+
+    _atomic_write(path, write)
+
+
+def missing_ranges(namespace, group, start_date, end_date, last_final, backfilled=None):
+    """
+    Return the parts of [start_date, end_date] that are not on disk yet, or that
+    are after last_final, as a list of (start, end) date tuples, both ends inclusive.
+    """
+    missing = []
+    cursor = start_date
+    # Ranges recorded under an earlier last_final may reach past the current one
+    for start, end in read_manifest(namespace, group, backfilled):
+        end = min(end, last_final)
+        if end < cursor or end < start:
+            continue
+        if start > end_date:
+            break
+        if start > cursor:
+            missing.append((cursor, start - timedelta(days=1)))
+        cursor = max(cursor, end + timedelta(days=1))
+    if cursor <= end_date:
+        missing.append((cursor, end_date))
+    return missing
+
+
+def store(namespace, group, df, start_date, end_date, last_final, backfilled=None):
+    """
+    Merge df into the monthly partitions and mark [start_date, end_date] as cached.
+
+    Days after last_final are stored but not marked as cached,
+    since ingest_elhub may still deliver or rewrite rows for them.
+    """
+    with _lock:
+        if not df.empty:
+            df = df.copy()
+            df["starttime"] = pd.to_datetime(df["starttime"])
+            periods = df["starttime"].dt.to_period("M").astype(str)
+            for period, part in df.groupby(periods):
+                path = _month_path(namespace, group, period)
+                if path.exists():
+                    part = pd.concat([pd.read_parquet(path), part], ignore_index=True)
+                part = (
+                    part.drop_duplicates(subset=KEY_COLUMNS, keep="last")
+                    .sort_values(["starttime", "pricearea"])
+                    .reset_index(drop=True)
+                )
+                _atomic_write(path, lambda tmp, part=part: part.to_parquet(tmp, index=False))
+
+        end_date = min(end_date, last_final)
+        if start_date <= end_date:
+            ranges = read_manifest(namespace, group, backfilled) + [(start_date, end_date)]
+            _write_manifest(namespace, group, ranges, backfilled)
+
+
+def load(namespace, group, start_date, end_date):
+    """Read the cached rows for namespace/group with starttime within [start_date, end_date]."""
+    periods = pd.period_range(start_date, end_date, freq="M").astype(str)
+    paths = [_month_path(namespace, group, p) for p in periods]
+    frames = [pd.read_parquet(p) for p in paths if p.exists()]
+    if not frames:
+        return pd.DataFrame()
+
+    df = pd.concat(frames, ignore_index=True)
+    start = pd.Timestamp(start_date)
+    end = pd.Timestamp(end_date) + pd.Timedelta(days=1)
+    df = df[(df["starttime"] >= start) & (df["starttime"] < end)]
+    return df.reset_index(drop=True)
+
+
+def clear(namespace=None, group=None):
+    """Remove cached partitions, optionally limited to one namespace or namespace/group."""
+    target = CACHE_DIR
+    if namespace is not None:
+        target = target / namespace
+        if group is not None:
+            target = target / group
+    if not target.exists():
+        return
+    for path in sorted(target.rglob("*"), reverse=True):
+        if path.is_dir():
+            path.rmdir()
+        else:
+            path.unlink()
+    target.rmdir()
@@ -6,7 +6,8 @@ import numpy as np
 from statsmodels.tsa.seasonal import STL
 from statsmodels.nonparametric.smoothers_lowess import lowess
 from scipy.signal import stft
-from load_data import load_data_from_mongodb_no_arguments
+from frame_schema import to_chart_frame
+from load_data import iter_production_chunks, fold_chunks, SumFold, FilterFold
 
 def _make_odd(x):
     """Return an odd integer >= 3 from x (int or None)."""
@@ -48,7 +49,7 @@ def loess_decompose_and_plot(
     fig : plotly.graph_objects.Figure
     """
 
-    df = df.copy()
+    df = to_chart_frame(df)
     df['starttime'] = pd.to_datetime(df['starttime'])
     df = df.sort_values('starttime')
     series = df.groupby('starttime')['quantitykwh'].sum()
@@ -148,7 +149,7 @@ def plot_spectrogram_stft(df, pricearea='NO1', productiongroup='hydro',
     """
     
     # Filter data
-    dff = df[(df['pricearea'] == pricearea) & (df['productiongroup'] == productiongroup)].copy()
+    dff = to_chart_frame(df[(df['pricearea'] == pricearea) & (df['productiongroup'] == productiongroup)])
     if dff.empty:
         raise ValueError("No data for the given filters.")
 
@@ -191,34 +192,41 @@ def plot_spectrogram_stft(df, pricearea='NO1', productiongroup='hydro',
 
 def energy_plots_page():
 
-    # Initialize df
-    if 'df' not in st.session_state:
-        st.session_state.df = None
+    # Initialize the folded data
+    if 'energy_totals' not in st.session_state:
+        st.session_state.energy_totals = None
+    if 'energy_spectrogram' not in st.session_state:
+        st.session_state.energy_spectrogram = None
     
     st.subheader("Seasonal-Trend decomposition and Spectrogram of energy data")
-    st.write("If you did not query data on the previous page, please click the Query Data button to load data into the plots.")
+    st.write("Please click the Query Data button to load data into the plots.")
     st.write("Please choose which plot you want to see below the Query Data button.")
 
-    # Load data
+    # Stream the production collection month by month and keep only what the plots need:
+    # hourly totals for the STL analysis and the NO1 hydro series for the spectrogram
     if st.button("Query Data"):
         with st.spinner("Querying database..."):
-            st.session_state.df = load_data_from_mongodb_no_arguments()
+            st.session_state.energy_totals, st.session_state.energy_spectrogram = fold_chunks(
+                iter_production_chunks(),
+                SumFold('starttime'),
+                FilterFold(pricearea='NO1', productiongroup='hydro')
+            )
 
     tab1, tab2 = st.tabs(["STL analysis", "Spectrogram"])
 
-    if st.session_state.df is not None:
+    if st.session_state.energy_totals is not None:
         # Content for Tab 1
         with tab1:
             st.header("STL analysis")
             with st.spinner("Doing STL analysis..."):
-                fig = loess_decompose_and_plot(st.session_state.df)
+                fig = loess_decompose_and_plot(st.session_state.energy_totals)
             st.plotly_chart(fig)
 
         # Content for Tab 2
         with tab2:
             st.header("Spectrogram")
             with st.spinner("Creating spectrogram..."):
-                fig = plot_spectrogram_stft(st.session_state.df)
+                fig = plot_spectrogram_stft(st.session_state.energy_spectrogram)
             st.plotly_chart(fig)
     else:
         st.write("Please query the data to see the plots")
\ No newline at end of file
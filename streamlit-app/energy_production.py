@@ -1,6 +1,6 @@
 import streamlit as st
 import plotly.express as px
-from load_data import load_data_from_mongodb_no_arguments
+from load_data import load_production_totals, load_production_months, load_production_hourly_sums
 
 def energy_production_page():
     
@@ -8,14 +8,19 @@ def energy_production_page():
     st.write("Please click the Query Data button to load data into the plots.")
 
     # Initialize session state for storing results
-    if 'df' not in st.session_state:
-        st.session_state.df = None
+    if 'production_totals' not in st.session_state:
+        st.session_state.production_totals = None
+    if 'production_months' not in st.session_state:
+        st.session_state.production_months = None
 
+    # Sums per price area and production group and the list of months are computed inside MongoDB
     if st.button("Query Data"):
         with st.spinner("Querying database..."):
-            st.session_state.df = load_data_from_mongodb_no_arguments()
+            st.session_state.production_totals = load_production_totals()
+            st.session_state.production_months = load_production_months()
 
-    if st.session_state.df is not None:
+    if st.session_state.production_totals is not None:
+        totals = st.session_state.production_totals
         col1, col2 = st.columns(2)
 
         # Set a fixed height for containers
@@ -26,7 +31,7 @@ def energy_production_page():
             st.header("Energy Produciton by Price Area")
             # Radio buttons to select price area
             # Get unique price areas
-            price_areas = sorted(st.session_state.df['pricearea'].unique())
+            price_areas = sorted(totals['pricearea'].unique())
 
             with st.container(height=CONTAINER_HEIGHT):
                 st.subheader("Select Price Area:")
@@ -35,11 +40,8 @@ def energy_production_page():
                     options=price_areas,
                     horizontal=True
                 )
-            # Filter data by selected price area
-            filtered_df = st.session_state.df[st.session_state.df['pricearea'] == selected_area]
-
-            # Group by productiongroup and sum quantitykwh
-            grouped_data = filtered_df.groupby('productiongroup')['quantitykwh'].sum().reset_index()
+            # Sums by productiongroup for the selected price area
+            grouped_data = totals[totals['pricearea'] == selected_area]
 
             # Create pie chart
             fig = px.pie(
@@ -70,11 +72,9 @@ def energy_production_page():
             
             st.header("Energy Production Analysis")
             
-            st.session_state.df['year_month'] = st.session_state.df['starttime'].dt.to_period('M').astype(str)
-
             # Get unique values for filters
-            production_groups = sorted(st.session_state.df['productiongroup'].unique().tolist())
-            available_months = sorted(st.session_state.df['year_month'].unique().tolist())
+            production_groups = sorted(totals['productiongroup'].unique().tolist())
+            available_months = st.session_state.production_months
 
             with st.container(height=CONTAINER_HEIGHT):
                 # Production Groups filter
@@ -102,17 +102,11 @@ def energy_production_page():
                 if not isinstance(selected_groups, list):
                     selected_groups = [selected_groups]
                 
-                filtered_df = st.session_state.df[
-                    (st.session_state.df['productiongroup'].isin(selected_groups)) & 
-                    (st.session_state.df['year_month'] == selected_month)
-                ].copy()
+                # Hourly sums across all price areas for the selected month
+                month_df = load_production_hourly_sums(selected_month)
+                plot_df = month_df[month_df['productiongroup'].isin(selected_groups)] if not month_df.empty else month_df
                 
-                if not filtered_df.empty:
-                    # Sum across all price areas - only group by productiongroup and starttime
-                    plot_df = filtered_df.groupby(
-                        ['productiongroup', 'starttime'], as_index=False
-                    )['quantitykwh'].sum()
-                    
+                if not plot_df.empty:
                     # Create line plot - color only by production group
                     fig = px.line(
                         plot_df,
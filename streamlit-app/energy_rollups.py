@@ -0,0 +1,180 @@
+"""
+Daily and monthly rollups of the hourly energy collections.
+
+For every namespace two small collections are kept next to the hourly one,
+production_NO1_daily and production_NO1_monthly (and the same for
+consumption), with one document per (pricearea, group, day or month):
+the summed quantitykwh and the number of hours behind it, so means can be
+computed exactly. Days and months are UTC, like the stored starttime.
+
+ingest_elhub refreshes the affected range after every run. For a database
+filled some other way, build them once with:
+    python energy_rollups.py rebuild --uri mongodb://localhost:27017 --database IND320
+
+Every refresh records the months it recomputed for each price area in the
+rollup_coverage collection. A rollup only agrees with the hourly collection in
+those months, so readers check covered() before using it.
+"""
+
+import argparse
+
+import pandas as pd
+from pymongo import ASCENDING, MongoClient, UpdateOne
+
+from energy_schema import GROUP_FIELDS, PRICE_AREAS, group_field
+
+LEVELS = ["daily", "monthly"]
+
+# One document per (namespace, price area) listing the months (YYYY-MM) its rollups were computed for
+COVERAGE = "rollup_coverage"
+
+# Format of the bucket each level groups the starttime into
+_BUCKET_FORMAT = {"daily": "%Y-%m-%d", "monthly": "%Y-%m"}
+
+
+def rollup_name(namespace, level):
+    """Name of the rollup collection for a namespace and level."""
+    return f"{namespace}_{level}"
+
+
+def ensure_indexes(db, namespace):
+    group = group_field(namespace)
+    for level in LEVELS:
+        db[rollup_name(namespace, level)].create_index(
+            [(group, ASCENDING), ("pricearea", ASCENDING), ("starttime", ASCENDING)],
+            name=f"{group}_pricearea_starttime",
+            unique=True,
+        )
+
+
+def _rollup_pipeline(namespace, level, query, count):
+    """Group documents matching query into level buckets; count is the field or value counting hours."""
+    group = group_field(namespace)
+    return [
+        {"$match": query},
+        {"$group": {
+            "_id": {
+                "pricearea": "$pricearea",
+                group: f"${group}",
+                "bucket": {"$dateToString": {"format": _BUCKET_FORMAT[level], "date": "$starttime"}},
+            },
+            "quantitykwh": {"$sum": "$quantitykwh"},
+            "count": {"$sum": count},
+        }},
+    ]
+
+
+def _month_bounds(start, end):
+    """Start of the first UTC month overlapping [start, end) and start of the month after the last one."""
+    first = pd.Timestamp(start).to_period("M").start_time.to_pydatetime()
+    last = ((pd.Timestamp(end) - pd.Timedelta(microseconds=1)).to_period("M") + 1).start_time.to_pydatetime()
+    return first, last
+
+
+def _months(first, last):
+    """Months (YYYY-MM) from the month starting at first up to, not including, the one starting at last."""
+    return [str(month) for month in pd.period_range(first, last, freq="M")[:-1]]
+
+
+def covered(db, namespace, start, end, priceareas=PRICE_AREAS):
+    """
+    True when the rollups of every given price area have been computed for every
+    UTC month overlapping [start, end), so they give the same sums as the hourly rows.
+    """
+    needed = set(_months(*_month_bounds(start, end)))
+    months = {
+        doc["pricearea"]: set(doc["months"])
+        for doc in db[COVERAGE].find({"namespace": namespace, "pricearea": {"$in": list(priceareas)}})
+    }
+    return all(needed <= months.get(pricearea, set()) for pricearea in priceareas)
+
+
+def uncover(db, namespace, pricearea, start, end):
+    """Drop the UTC months overlapping [start, end) from the coverage, before their hourly rows are rewritten."""
+    db[COVERAGE].update_one(
+        {"_id": f"{namespace}/{pricearea}"},
+        {"$pull": {"months": {"$in": _months(*_month_bounds(start, end))}}},
+    )
+
+
+def _write_buckets(collection, namespace, buckets):
+    group = group_field(namespace)
+    requests = [
+        UpdateOne(
+            {
+                "pricearea": b["_id"]["pricearea"],
+                group: b["_id"][group],
+                "starttime": pd.Timestamp(b["_id"]["bucket"]).to_pydatetime(),
+            },
+            {"$set": {"quantitykwh": b["quantitykwh"], "count": b["count"]}},
+            upsert=True,
+        )
+        for b in buckets
+    ]
+    if requests:
+        collection.bulk_write(requests, ordered=False)
+    return len(requests)
+
+
+def refresh(db, namespace, pricearea, start, end):
+    """
+    Recompute the rollups of one price area for every UTC month overlapping [start, end).
+    Whole months are recomputed from the hourly rows, so the result does not depend on
+    what was stored before.
+    """
+    first, last = _month_bounds(start, end)
+    window = {"pricearea": pricearea, "starttime": {"$gte": first, "$lt": last}}
+
+    daily = list(db[namespace].aggregate(_rollup_pipeline(namespace, "daily", window, 1)))
+    n_daily = _write_buckets(db[rollup_name(namespace, "daily")], namespace, daily)
+
+    monthly = list(db[rollup_name(namespace, "daily")].aggregate(
+        _rollup_pipeline(namespace, "monthly", window, "$count")
+    ))
+    n_monthly = _write_buckets(db[rollup_name(namespace, "monthly")], namespace, monthly)
+
+    # Recorded last, a failed refresh leaves the months uncovered
+    db[COVERAGE].update_one(
+        {"_id": f"{namespace}/{pricearea}"},
+        {
+            "$set": {"namespace": namespace, "pricearea": pricearea},
+            "$addToSet": {"months": {"$each": _months(first, last)}},
+        },
+        upsert=True,
+    )
+    return n_daily, n_monthly
+
+
+def rebuild(db, namespace):
+    """
+    Build the rollups of a namespace from all hourly rows. Every price area is
+    refreshed over the months of the whole collection, also the areas without
+    rows there, so all of them are covered for every month with data.
+    """
+    ensure_indexes(db, namespace)
+    bounds = list(db[namespace].aggregate([
+        {"$group": {"_id": None, "first": {"$min": "$starttime"}, "last": {"$max": "$starttime"}}},
+    ]))
+    if not bounds:
+        return
+    for pricearea in sorted(set(PRICE_AREAS) | set(db[namespace].distinct("pricearea"))):
+        n_daily, n_monthly = refresh(db, namespace, pricearea, bounds[0]["first"], bounds[0]["last"] + pd.Timedelta(hours=1))
+        print(f"{namespace} {pricearea}: {n_daily} days, {n_monthly} months")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--uri", default="mongodb://localhost:27017")
+    parser.add_argument("--database", default="IND320")
+    parser.add_argument("--namespaces", nargs="+", choices=list(GROUP_FIELDS), default=list(GROUP_FIELDS))
+    args = parser.parse_args()
+
+    client = MongoClient(args.uri)
+    for namespace in args.namespaces:
+        rebuild(client[args.database], namespace)
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
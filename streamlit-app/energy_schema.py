@@ -0,0 +1,51 @@
+"""
+Collections, group fields, price areas and query filters of the energy data.
+
+Kept free of Streamlit and the data layer, so the command line tools
+(ingest_elhub, energy_rollups, mongo_indexes, load_test) can share them with
+load_data without importing the app.
+"""
+
+from datetime import datetime, time
+
+PRICE_AREAS = ["NO1", "NO2", "NO3", "NO4", "NO5"]
+
+# Group field of each hourly energy collection
+GROUP_FIELDS = {"production_NO1": "productiongroup", "consumption_NO1": "consumptiongroup"}
+
+# Ingest dataset writing each hourly energy collection
+DATASET_NAMES = {"production_NO1": "production", "consumption_NO1": "consumption"}
+
+# Collection with the newest lastUpdatedTime ingested per (dataset, price area)
+WATERMARKS = "ingest_watermarks"
+
+# Elhub revises settled hours for a few months, an incremental ingest requests
+# the months starting this many days before the watermark
+LOOKBACK_DAYS = 90
+
+
+def group_field(namespace):
+    """Return the name of the group field for the given namespace"""
+    if namespace not in GROUP_FIELDS:
+        raise ValueError("Invalid namespace")
+    return GROUP_FIELDS[namespace]
+
+
+def build_query(namespace, group, start_date=None, end_date=None):
+    """Build the find/$match filter for a group and an optional date range"""
+
+    # Build the query
+    query = {group_field(namespace): group}
+
+    # Add date filter if dates are provided
+    if start_date is not None and end_date is not None:
+        start_datetime = datetime.combine(start_date, time(0, 0, 0))
+        end_datetime = datetime.combine(end_date, time(23, 59, 59))
+
+        # Use 'starttime' as the datetime field name (based on your second query)
+        query['starttime'] = {
+            '$gte': start_datetime,
+            '$lte': end_datetime
+        }
+
+    return query
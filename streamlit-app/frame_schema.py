@@ -0,0 +1,46 @@
+"""
+Canonical compact dtypes for the energy and weather frames.
+
+The energy loaders apply the schema once at load time, so the frames kept in
+the Streamlit caches and in session state use categoricals for the area and
+group columns and float32 for the measures. Weather arrays are stored as
+float32 by weather_store. Charts get a widened copy through to_chart_frame
+right before plotting.
+"""
+
+import pandas as pd
+
+# Low cardinality string columns in the energy collections
+ENERGY_CATEGORICAL_COLUMNS = ["pricearea", "productiongroup", "consumptiongroup"]
+
+# Measures stored as float32
+ENERGY_FLOAT_COLUMNS = ["quantitykwh"]
+
+
+def apply_energy_schema(df):
+    """Return df with categorical area/group columns, datetime64 starttime and float32 measures."""
+    if df.empty:
+        return df
+    df = df.copy()
+    for col in ENERGY_CATEGORICAL_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+    if "starttime" in df.columns and not pd.api.types.is_datetime64_any_dtype(df["starttime"]):
+        df["starttime"] = pd.to_datetime(df["starttime"])
+    for col in ENERGY_FLOAT_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype("float32")
+    return df
+
+
+def to_chart_frame(df):
+    """
+    Return a copy of df widened for plotting and numerical work:
+    float32 columns become float64 and categoricals become plain strings.
+    """
+    df = df.copy()
+    for col in df.select_dtypes(include=["float32", "float16"]).columns:
+        df[col] = df[col].astype("float64")
+    for col in df.select_dtypes(include=["category"]).columns:
+        df[col] = df[col].astype(str)
+    return df
@@ -0,0 +1,379 @@
+"""
+Ingestion of Elhub production and consumption data into MongoDB.
+
+Replaces the month-by-month loops in notebooks part2/part4. The requested
+period is split into (month, price area) slices that are fetched concurrently
+under a shared request rate limit. Each response is parsed as a stream, and
+the records are written as they arrive with unordered bulk upserts keyed on
+(pricearea, group, starttime). Running the same period twice leaves the
+collections unchanged.
+
+Every record carries lastUpdatedTime. A row is only written when it is newer
+than the stored one, and after a run the newest lastUpdatedTime seen is kept
+as a watermark per (dataset, price area) in the ingest_watermarks collection.
+With --incremental the period is taken from the watermarks instead: only the
+months that Elhub may still revise are requested, and records that are not
+newer than the watermark are skipped before they reach MongoDB.
+
+The daily and monthly rollups in energy_rollups are refreshed for the months
+that changed. Runs reaching back before the watermark lookback are recorded as
+backfills in the watermarks, so the Parquet cache of the app fetches again.
+
+Times are stored the way the notebooks stored them: naive UTC datetimes in
+lowercase fields (starttime, lastupdatedtime).
+
+Responses can be saved with --record and played back with --replay instead
+of calling the API, for testing without network access.
+
+Usage:
+    python ingest_elhub.py --dataset production consumption --start 2021-01 --end 2024-12
+    python ingest_elhub.py --dataset production consumption --incremental
+    python ingest_elhub.py --dataset production --start 2021-01 --end 2021-03 --record responses/
+    python ingest_elhub.py --dataset production --start 2021-01 --end 2021-03 --replay responses/
+"""
+
+import argparse
+import io
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pandas as pd
+import requests
+from pymongo import MongoClient, UpdateOne
+from retry_requests import retry
+
+import energy_rollups
+from energy_schema import GROUP_FIELDS, LOOKBACK_DAYS, PRICE_AREAS, WATERMARKS
+from mongo_indexes import ensure_index, index_specs
+
+try:
+    # Incremental JSON parser, records are decoded while the response downloads
+    import ijson
+except ImportError:
+    ijson = None
+
+API_URL = "https://api.elhub.no/energy-data/v0/price-areas"
+
+# Elhub dataset, attribute holding the records, target collection and group field
+DATASETS = {
+    "production": (
+        "PRODUCTION_PER_GROUP_MBA_HOUR", "productionPerGroupMbaHour", "production_NO1", GROUP_FIELDS["production_NO1"]
+    ),
+    "consumption": (
+        "CONSUMPTION_PER_GROUP_MBA_HOUR", "consumptionPerGroupMbaHour", "consumption_NO1", GROUP_FIELDS["consumption_NO1"]
+    ),
+}
+
+# Months are cut at local midnight, as Elhub reports in Norwegian time
+TIMEZONE = "Europe/Oslo"
+
+# Upserts sent to MongoDB in one bulk_write
+BULK_SIZE = 5000
+
+
+class RateLimiter:
+    """Allow at most rate calls per second, shared between threads."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self.next_call = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_call - now
+            self.next_call = max(now, self.next_call) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+class ElhubSource:
+    """Streams responses from the Elhub API, optionally saving each one under record_dir."""
+
+    def __init__(self, rate, record_dir=None):
+        self.session = retry(requests.Session(), retries=5, backoff_factor=0.5)
+        self.limiter = RateLimiter(rate)
+        self.record_dir = record_dir
+
+    def open(self, dataset, area, start, end):
+        self.limiter.wait()
+        response = self.session.get(
+            f"{API_URL}/{area}",
+            params={"dataset": dataset, "startDate": start.isoformat(), "endDate": end.isoformat()},
+            stream=True,
+            timeout=60,
+        )
+        response.raise_for_status()
+        if self.record_dir is None:
+            response.raw.decode_content = True
+            return response.raw
+        content = response.content
+        path = _recording_path(self.record_dir, dataset, area, start)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(content)
+        return io.BytesIO(content)
+
+
+class ReplaySource:
+    """Plays back responses saved by ElhubSource instead of calling the API."""
+
+    def __init__(self, replay_dir):
+        self.replay_dir = replay_dir
+
+    def open(self, dataset, area, start, end):
+        return open(_recording_path(self.replay_dir, dataset, area, start), "rb")
+
+
+def _recording_path(directory, dataset, area, start):
+    return Path(directory) / dataset / area / f"{start:%Y-%m}.json"
+
+
+def month_slices(start_month, end_month, areas):
+    """(area, start, end) for every month from start_month to end_month (YYYY-MM, inclusive)."""
+    months = pd.date_range(start_month, end_month, freq="MS")
+    slices = []
+    for month in months:
+        start = month.tz_localize(TIMEZONE)
+        end = (month + pd.offsets.MonthBegin()).tz_localize(TIMEZONE)
+        slices.extend((area, start, end) for area in areas)
+    return slices
+
+
+def iter_records(stream, attribute):
+    """Yield the records of one response one at a time."""
+    if ijson is not None:
+        yield from ijson.items(stream, f"data.item.attributes.{attribute}.item", use_float=True)
+    else:
+        for entry in json.load(stream)["data"]:
+            yield from entry["attributes"][attribute]
+
+
+def _utc_naive(timestamp):
+    """Parse an ISO timestamp with offset into a naive UTC datetime."""
+    return datetime.fromisoformat(timestamp).astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _slice_utc(timestamp):
+    """Convert a slice bound in local time into a naive UTC timestamp."""
+    return timestamp.tz_convert("UTC").tz_localize(None)
+
+
+def _utc_now():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def to_upsert(record, group_field, last_updated):
+    """
+    UpdateOne for one Elhub record, keyed on (pricearea, group, starttime).
+    An existing row keeps its value unless the record has a newer lastUpdatedTime.
+    """
+    key = {
+        "pricearea": record["priceArea"],
+        group_field: record[group_field.replace("group", "Group")],
+        "starttime": _utc_naive(record["startTime"]),
+    }
+    # Both expressions see the stored document, a missing lastupdatedtime sorts before any date
+    is_newer = {"$lt": ["$lastupdatedtime", last_updated]}
+    update = [{"$set": {
+        "quantitykwh": {"$cond": [is_newer, float(record["quantityKwh"]), "$quantitykwh"]},
+        "lastupdatedtime": {"$max": ["$lastupdatedtime", last_updated]},
+    }}]
+    return UpdateOne(key, update, upsert=True)
+
+
+def ingest_slice(source, collection, dataset_name, area, start, end, since=None):
+    """
+    Fetch one (month, area) slice and upsert it in batches, returning write counts and
+    the newest lastUpdatedTime seen. Records not updated after since are skipped.
+    """
+    dataset, attribute, _, group_field = DATASETS[dataset_name]
+    counts = {"records": 0, "skipped": 0, "upserted": 0, "modified": 0, "latest": None}
+
+    def flush(batch):
+        result = collection.bulk_write(batch, ordered=False)
+        counts["upserted"] += result.upserted_count
+        counts["modified"] += result.modified_count
+
+    stream = source.open(dataset, area, start, end)
+    try:
+        batch = []
+        for record in iter_records(stream, attribute):
+            last_updated = _utc_naive(record["lastUpdatedTime"])
+            if counts["latest"] is None or last_updated > counts["latest"]:
+                counts["latest"] = last_updated
+            if since is not None and last_updated <= since:
+                counts["skipped"] += 1
+                continue
+            batch.append(to_upsert(record, group_field, last_updated))
+            if len(batch) == BULK_SIZE:
+                flush(batch)
+                counts["records"] += len(batch)
+                batch = []
+        if batch:
+            flush(batch)
+            counts["records"] += len(batch)
+    finally:
+        stream.close()
+    return counts
+
+
+def _watermark_id(dataset_name, area):
+    return f"{dataset_name}/{area}"
+
+
+def read_watermark(db, dataset_name, area):
+    """Newest lastUpdatedTime ingested for a dataset and price area, or None."""
+    doc = db[WATERMARKS].find_one({"_id": _watermark_id(dataset_name, area)})
+    return doc.get("lastupdatedtime") if doc else None
+
+
+def _mark_backfill(db, dataset_name, area):
+    """Record that rows of any month may be rewritten, before the backfill writes them."""
+    db[WATERMARKS].update_one(
+        {"_id": _watermark_id(dataset_name, area)},
+        {"$set": {"dataset": dataset_name, "pricearea": area, "backfilledtime": _utc_now()}},
+        upsert=True,
+    )
+
+
+def _write_watermark(db, dataset_name, area, last_updated):
+    db[WATERMARKS].update_one(
+        {"_id": _watermark_id(dataset_name, area)},
+        {
+            "$max": {"lastupdatedtime": last_updated},
+            "$set": {"dataset": dataset_name, "pricearea": area, "refreshedtime": _utc_now()},
+        },
+        upsert=True,
+    )
+
+
+def _lookback_month(watermark, lookback_days=LOOKBACK_DAYS):
+    """First month (YYYY-MM) that an incremental run requests."""
+    return f"{watermark - timedelta(days=lookback_days):%Y-%m}"
+
+
+def plan_slices(db, dataset_names, areas, start_month=None, end_month=None, incremental=False,
+                lookback_days=LOOKBACK_DAYS):
+    """
+    (dataset, area, start, end, since) for every slice to fetch. In incremental mode the
+    months come from the watermark of each (dataset, area) and since is the watermark,
+    falling back to start_month for pairs that were never ingested.
+    """
+    tasks = []
+    for dataset_name in dataset_names:
+        for area in areas:
+            since = read_watermark(db, dataset_name, area) if incremental else None
+            if since is not None:
+                first = _lookback_month(since, lookback_days)
+                last = end_month or f"{_utc_now():%Y-%m}"
+            elif start_month is not None:
+                first, last = start_month, end_month or f"{_utc_now():%Y-%m}"
+            else:
+                raise ValueError(f"No watermark for {dataset_name} {area}, give --start for the first backfill")
+            tasks.extend((dataset_name, a, start, end, since) for a, start, end in month_slices(first, last, [area]))
+    return tasks
+
+
+def ingest(db, source, tasks, workers=8):
+    """
+    Ingest the planned slices concurrently and return the total counts. Watermarks are
+    advanced only after every slice has been written. The rollups of every planned
+    slice are refreshed once the writes have stopped, also when a slice failed.
+    """
+    for dataset_name in {task[0] for task in tasks}:
+        namespace = DATASETS[dataset_name][2]
+        # The unique key index keeps every upsert an index lookup, and one document per hour
+        ensure_index(db[namespace], *index_specs(namespace)[0])
+        energy_rollups.ensure_indexes(db, namespace)
+
+    planned = {}
+    for dataset_name, area, start, end, _ in tasks:
+        first, last = planned.get((dataset_name, area), (start, end))
+        planned[(dataset_name, area)] = (min(first, start), max(last, end))
+    # The months about to be rewritten are read from the hourly collection until their
+    # rollups are refreshed, so a failed or interrupted run cannot leave stale rollups covered
+    for (dataset_name, area), (start, end) in planned.items():
+        energy_rollups.uncover(db, DATASETS[dataset_name][2], area, _slice_utc(start), _slice_utc(end))
+    # The local Parquet cache of load_data holds the months before the watermark lookback,
+    # slices reaching back further invalidate it
+    for (dataset_name, area), (start, _) in planned.items():
+        watermark = read_watermark(db, dataset_name, area)
+        if watermark is None or start < pd.Timestamp(_lookback_month(watermark)).tz_localize(TIMEZONE):
+            _mark_backfill(db, dataset_name, area)
+
+    totals = {"records": 0, "skipped": 0, "upserted": 0, "modified": 0}
+    latest = {}
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(ingest_slice, source, db[DATASETS[d][2]], d, area, start, end, since): (d, area, start, end)
+                for d, area, start, end, since in tasks
+            }
+            for future in as_completed(futures):
+                dataset_name, area, start, end = futures[future]
+                counts = future.result()
+                for k in totals:
+                    totals[k] += counts[k]
+                if counts["latest"] is not None:
+                    key = (dataset_name, area)
+                    latest[key] = max(latest.get(key, counts["latest"]), counts["latest"])
+                print(
+                    f"{dataset_name:<12} {area} {start:%Y-%m}: {counts['records']:>6} records, "
+                    f"{counts['skipped']:>6} unchanged, {counts['upserted']:>6} new, {counts['modified']:>6} changed"
+                )
+    finally:
+        # The pool has waited for every running slice, so the rollups are recomputed from the
+        # hourly rows as they now are, months overlapping two slices included
+        for (dataset_name, area), (start, end) in planned.items():
+            energy_rollups.refresh(db, DATASETS[dataset_name][2], area, _slice_utc(start), _slice_utc(end))
+
+    for (dataset_name, area), last_updated in latest.items():
+        _write_watermark(db, dataset_name, area, last_updated)
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset", nargs="+", choices=list(DATASETS), default=list(DATASETS))
+    parser.add_argument("--start", help="First month, YYYY-MM")
+    parser.add_argument("--end", help="Last month, YYYY-MM, defaults to the current month")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only fetch the months after the stored watermarks that may have changed")
+    parser.add_argument("--lookback-days", type=int, default=LOOKBACK_DAYS,
+                        help="Days before the watermark that are fetched again in incremental mode")
+    parser.add_argument("--areas", nargs="+", choices=PRICE_AREAS, default=PRICE_AREAS)
+    parser.add_argument("--uri", default="mongodb://localhost:27017")
+    parser.add_argument("--database", default="IND320")
+    parser.add_argument("--workers", type=int, default=8, help="Slices fetched at the same time")
+    parser.add_argument("--rate", type=float, default=5.0, help="Maximum API requests per second")
+    source_group = parser.add_mutually_exclusive_group()
+    source_group.add_argument("--record", type=Path, help="Save every API response in this directory")
+    source_group.add_argument("--replay", type=Path, help="Read responses saved with --record instead of the API")
+    args = parser.parse_args()
+    if args.start is None and not args.incremental:
+        parser.error("--start is required without --incremental")
+
+    source = ReplaySource(args.replay) if args.replay else ElhubSource(args.rate, args.record)
+    client = MongoClient(args.uri)
+    db = client[args.database]
+    try:
+        tasks = plan_slices(db, args.dataset, args.areas, args.start, args.end, args.incremental, args.lookback_days)
+    except ValueError as e:
+        parser.error(str(e))
+    start = time.perf_counter()
+    totals = ingest(db, source, tasks, args.workers)
+    elapsed = time.perf_counter() - start
+    print(
+        f"{totals['records']} records in {elapsed:.1f} s ({totals['records'] / elapsed:.0f}/s), "
+        f"{totals['skipped']} unchanged, {totals['upserted']} new, {totals['modified']} changed"
+    )
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,23 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import json
-from pymongo import MongoClient
 import openmeteo_requests
 from retry_requests import retry
-import requests_cache
-from datetime import datetime, time
+import requests
+from datetime import date, datetime, time, timedelta
+import energy_cache
+import weather_store
+from frame_schema import apply_energy_schema
+from mongo_client import get_database
+from energy_rollups import covered, rollup_name
+from energy_schema import DATASET_NAMES, LOOKBACK_DAYS, PRICE_AREAS, WATERMARKS, build_query, group_field
+
+try:
+    # Decodes raw BSON batches straight into Arrow columns
+    from pymongoarrow.api import Schema, find_arrow_all
+except ImportError:
+    find_arrow_all = None
 
 @st.cache_data
 def load_data(file):
@@ -16,45 +28,21 @@ def load_json(file):
     with open(file, "r") as f:
         return json.load(f)
 
-@st.cache_data
-def load_data_from_mongodb(namespace, group, start_date=None, end_date=None):
-    """Load all data from MongoDB and return as pandas DataFrame"""
+def _energy_fields(namespace):
+    """Fields used by the pages and their types, in document order"""
+    return {
+        'pricearea': str,
+        group_field(namespace): str,
+        'starttime': datetime,
+        'quantitykwh': float
+    }
 
-    # Connecting to MongoDB
-    uri = st.secrets["mongo"]["uri"]
-    db_name = st.secrets["mongo"]["database"]
-    client = MongoClient(uri)
-    db = client[db_name]
-    collection = db[namespace]
-
-    # Determine the correct field name based on namespace
-    if namespace == 'production_NO1':
-        group_field = 'productiongroup'
-    elif namespace == 'consumption_NO1':
-        group_field = 'consumptiongroup'
-    else:
-        raise ValueError("Invalid namespace")
-    
-    # Build the query
-    query = {group_field: group}
-    
-    # Add date filter if dates are provided
-    if start_date is not None and end_date is not None:
-        start_datetime = datetime.combine(start_date, time(0, 0, 0))
-        end_datetime = datetime.combine(end_date, time(23, 59, 59))
-        
-        # Use 'starttime' as the datetime field name (based on your second query)
-        query['starttime'] = {
-            '$gte': start_datetime,
-            '$lte': end_datetime
-        }
+def _documents_to_frame(collection, query):
+    """Decode every document into a dict and build the DataFrame from the list"""
 
     # Execute query
     results = list(collection.find(query))
     
-    # Close connection
-    client.close()
-    
     # Convert to DataFrame
     df = pd.DataFrame(results)
     
@@ -64,158 +52,476 @@ def load_data_from_mongodb(namespace, group, start_date=None, end_date=None):
     
     return df
 
+def _find_frame(collection, query, fields, columnar=True):
+    """
+    Run a find projected on fields and return the result as pandas DataFrame.
+    In columnar mode the raw BSON batches are decoded straight into typed
+    Arrow columns by pymongoarrow, without building a dict per document.
+    Falls back to the list of dicts path when pymongoarrow is not installed.
+    """
+    if columnar and find_arrow_all is not None:
+        table = find_arrow_all(collection, query, schema=Schema(fields))
+        return table.to_pandas()
+
+    projection = {'_id': 0, **{field: 1 for field in fields}}
+    results = list(collection.find(query, projection))
+    return pd.DataFrame(results, columns=list(fields))
+
+def _query_mongodb(namespace, group, start_date=None, end_date=None):
+    """Query MongoDB directly and return the matching documents as pandas DataFrame"""
+
+    # Shared connection pool
+    collection = get_database()[namespace]
+
+    query = build_query(namespace, group, start_date, end_date)
+
+    return apply_energy_schema(_find_frame(collection, query, _energy_fields(namespace)))
+
+def _cache_state(namespace):
+    """
+    Last day of namespace that ingest_elhub no longer rewrites and the time of the latest
+    backfill, from the ingest watermarks and the last starttime in the hourly collection
+    """
+    _, end = _hourly_bounds(namespace)
+    if end is None:
+        return date.min, None
+
+    # The last hour may be followed by more hours of the same day
+    last_final = (end - timedelta(hours=1)).date() - timedelta(days=1)
+    watermarks = list(get_database()[WATERMARKS].find({'dataset': DATASET_NAMES[namespace]}))
+    stamps = [w['lastupdatedtime'] for w in watermarks if 'lastupdatedtime' in w]
+    if stamps:
+        # An incremental run rewrites from the Norwegian start of the month of the oldest
+        # watermark minus the lookback, which is 22:00 or 23:00 UTC the day before
+        first_month = (min(stamps) - timedelta(days=LOOKBACK_DAYS)).date().replace(day=1)
+        last_final = min(last_final, first_month - timedelta(days=2))
+    backfills = [w['backfilledtime'] for w in watermarks if 'backfilledtime' in w]
+    return last_final, max(backfills, default=None)
+
+@st.cache_data
+def load_data_from_mongodb(namespace, group, start_date=None, end_date=None):
+    """
+    Load data from MongoDB and return as pandas DataFrame.
+    When a date range is given, the local Parquet cache is used and only
+    the days that are not on disk yet are fetched from MongoDB.
+    """
+
+    if start_date is None or end_date is None:
+        return _query_mongodb(namespace, group)
+
+    # Fetch only the missing date ranges and merge them into the cache
+    last_final, backfilled = _cache_state(namespace)
+    for missing_start, missing_end in energy_cache.missing_ranges(
+        namespace, group, start_date, end_date, last_final, backfilled
+    ):
+        df = _query_mongodb(namespace, group, missing_start, missing_end)
+        energy_cache.store(namespace, group, df, missing_start, missing_end, last_final, backfilled)
+
+    return apply_energy_schema(energy_cache.load(namespace, group, start_date, end_date))
+
 @st.cache_data
 def load_data_from_mongodb_no_arguments():
     """Load all data from MongoDB and return as pandas DataFrame"""
-    # Connecting to MongoDB
-    uri = st.secrets["mongo"]["uri"]
-    db_name = st.secrets["mongo"]["database"]
-    client = MongoClient(uri)
-    db = client[db_name]
-    collection = db["production_NO1"]
+    # Shared connection pool
+    collection = get_database()["production_NO1"]
 
     # Fetch all documents
-    #documents = list(collection.find())
-    documents = list(collection.find())
-    
-    # Close the connection
-    client.close()
-    
-    # Convert to DataFrame
-    df = pd.DataFrame(documents)
-    
-    # Optional: Remove the MongoDB _id field if you don't need it
-    if '_id' in df.columns:
-        df = df.drop('_id', axis=1)
-    
-    return df
+    return apply_energy_schema(_find_frame(collection, {}, _energy_fields("production_NO1")))
 
-@st.cache_data
-def load_data_from_meteo(year, city):
-    # Setup the Open-Meteo API client with cache and retry on error
-    cache_session = requests_cache.CachedSession('.cache', expire_after = 3600)
-    retry_session = retry(cache_session, retries = 5, backoff_factor = 0.2)
-    openmeteo = openmeteo_requests.Client(session = retry_session)
-    cities = {
-    'Oslo':
-        {"price_area_code": "NO1",
-         "longitude": 10.7461,
-         "latitude": 59.9127
-        },
-    'Kristiansand':
-        {"price_area_code": "NO2",
-         "longitude": 7.9956,
-         "latitude": 58.1467
-        },
-    'Trondheim':
-        {"price_area_code": "NO3",
-         "longitude": 10.3951,
-         "latitude": 63.4305        
-        },
-    'Tromsø':
-        {"price_area_code": "NO4",
-         "longitude": 18.9551,
-         "latitude": 69.6489        
-        },
-    'Bergen':
-        {"price_area_code": "NO5",
-         "longitude": 5.3242,
-         "latitude": 60.393        
-        }
-    }
+# Default memory budget for one chunk of the streaming loader
+CHUNK_MAX_ROWS = 100_000
+CHUNK_MAX_BYTES = 64 * 2**20
 
-    selected_city = cities[city]
+def iter_production_chunks(max_rows=CHUNK_MAX_ROWS, max_bytes=CHUNK_MAX_BYTES, freq='MS'):
+    """
+    Stream the production collection as time-ordered DataFrame chunks.
 
-    start = f'{year}-01-01'
-    end = f'{year}-12-31'
+    The collection is read one time window (a month by default) at a time.
+    Windows holding more rows than the budget allows are split into equal
+    sub-windows, so no chunk exceeds max_rows rows or roughly max_bytes bytes.
+    """
+    collection = get_database()["production_NO1"]
+    fields = _energy_fields("production_NO1")
 
-    params = {
-    "latitude": selected_city['latitude'], 
-    "longitude": selected_city['longitude'],
-    "start_date": start,
-    "end_date": end,
-    "hourly": ["temperature_2m", "precipitation", "wind_speed_10m", "wind_gusts_10m", "wind_direction_10m"],
-    "models": "era5"
-    }
-    url = "https://archive-api.open-meteo.com/v1/archive"
-    responses = openmeteo.weather_api(url, params=params)
-    response = responses[0]
-    # Process hourly data. The order of variables needs to be the same as requested.
-    hourly = response.Hourly()
-    hourly_temperature_2m = hourly.Variables(0).ValuesAsNumpy()
-    hourly_precipitation = hourly.Variables(1).ValuesAsNumpy()
-    hourly_wind_speed_10m = hourly.Variables(2).ValuesAsNumpy()
-    hourly_wind_gusts_10m = hourly.Variables(3).ValuesAsNumpy()
-    hourly_wind_direction_10m = hourly.Variables(4).ValuesAsNumpy()
+    span = list(collection.aggregate([
+        {'$group': {'_id': None, 'first': {'$min': '$starttime'}, 'last': {'$max': '$starttime'}}}
+    ]))
+    if not span:
+        return
 
-    hourly_data = {"date": pd.date_range(
-        start = pd.to_datetime(hourly.Time(), unit = "s", utc = True),
-        end =  pd.to_datetime(hourly.TimeEnd(), unit = "s", utc = True),
-        freq = pd.Timedelta(seconds = hourly.Interval()),
-        inclusive = "left"
-    )}
+    edges = pd.date_range(pd.Timestamp(span[0]['first']).to_period('M').start_time,
+                          pd.Timestamp(span[0]['last']) + pd.offsets.MonthBegin(1), freq=freq)
+    row_budget = max_rows
 
-    hourly_data["temperature_2m"] = hourly_temperature_2m
-    hourly_data["precipitation"] = hourly_precipitation
-    hourly_data["wind_speed_10m"] = hourly_wind_speed_10m
-    hourly_data["wind_gusts_10m"] = hourly_wind_gusts_10m
-    hourly_data["wind_direction_10m"] = hourly_wind_direction_10m
+    for window_start, window_end in zip(edges[:-1], edges[1:]):
+        window = {'$gte': window_start.to_pydatetime(), '$lt': window_end.to_pydatetime()}
+        n_rows = collection.count_documents({'starttime': window})
+        if n_rows == 0:
+            continue
 
-    df = pd.DataFrame(data = hourly_data)
+        n_parts = -(-n_rows // row_budget)
+        sub_edges = pd.date_range(window_start, window_end, periods=n_parts + 1)
+        for sub_start, sub_end in zip(sub_edges[:-1], sub_edges[1:]):
+            query = {'starttime': {'$gte': sub_start.to_pydatetime(), '$lt': sub_end.to_pydatetime()}}
+            chunk = _find_frame(collection, query, fields).sort_values('starttime', kind='stable')
+            if chunk.empty:
+                continue
+            chunk = apply_energy_schema(chunk)
 
-    # Need to convert to float64 for the data to work in Streamlit
-    for col in df.select_dtypes(include=["float32", "float16"]).columns:
-        df[col] = df[col].astype("float64")
+            # Translate the byte budget into rows once the size of a row is known
+            bytes_per_row = chunk.memory_usage(deep=True).sum() / len(chunk)
+            row_budget = max(1, min(max_rows, int(max_bytes // bytes_per_row)))
+            yield chunk.reset_index(drop=True)
 
-    return df
+class SumFold:
+    """Sum value grouped by the columns in by, one chunk at a time"""
 
+    def __init__(self, by, value='quantitykwh'):
+        self.by = [by] if isinstance(by, str) else list(by)
+        self.value = value
+        self.partials = []
+
+    def update(self, chunk):
+        self.partials.append(chunk.groupby(self.by, observed=True)[self.value].sum())
+
+    def result(self):
+        if not self.partials:
+            return pd.DataFrame(columns=self.by + [self.value])
+        total = pd.concat(self.partials)
+        return total.groupby(level=self.by).sum().reset_index()
+
+class FilterFold:
+    """Keep the rows where every given column equals the given value, one chunk at a time"""
+
+    def __init__(self, **equals):
+        self.equals = equals
+        self.parts = []
+
+    def update(self, chunk):
+        mask = pd.Series(True, index=chunk.index)
+        for column, value in self.equals.items():
+            mask &= chunk[column] == value
+        self.parts.append(chunk[mask])
+
+    def result(self):
+        return pd.concat(self.parts, ignore_index=True) if self.parts else pd.DataFrame()
+
+def fold_chunks(chunks, *folds):
+    """
+    Feed every chunk to every fold in a single pass over the stream
+    and return the fold results in the same order.
+    """
+    for chunk in chunks:
+        for fold in folds:
+            fold.update(chunk)
+    return [fold.result() for fold in folds]
+
+def _aggregate(namespace, pipeline):
+    """Run an aggregation pipeline inside MongoDB and return the result as pandas DataFrame"""
+    collection = get_database()[namespace]
+    return pd.DataFrame(list(collection.aggregate(pipeline)))
+
+def _rollup_level(start_date=None, end_date=None):
+    """Coarsest rollup level whose buckets exactly cover the days from start_date to end_date"""
+    if start_date is None or (start_date.day == 1 and (end_date + timedelta(days=1)).day == 1):
+        return 'monthly'
+    return 'daily'
+
+def _hourly_bounds(namespace):
+    """First and last starttime in the hourly collection, read from the starttime index"""
+    collection = get_database()[namespace]
+    first = collection.find_one({}, {'_id': 0, 'starttime': 1}, sort=[('starttime', 1)])
+    last = collection.find_one({}, {'_id': 0, 'starttime': 1}, sort=[('starttime', -1)])
+    if first is None:
+        return None, None
+    return first['starttime'], last['starttime'] + timedelta(hours=1)
+
+def _source(namespace, level, start_date=None, end_date=None, priceareas=PRICE_AREAS):
+    """
+    Name of the rollup collection of the given level when its coverage includes every
+    month with hourly rows between start_date and end_date (all of them when not given)
+    for the price areas, otherwise the hourly collection. Sums give the same result on both.
+    """
+    first, last = _hourly_bounds(namespace)
+    if first is None:
+        return namespace
+    if start_date is not None:
+        first = max(first, datetime.combine(start_date, time(0, 0)))
+        last = min(last, datetime.combine(end_date + timedelta(days=1), time(0, 0)))
+    if first < last and covered(get_database(), namespace, first, last, priceareas):
+        return rollup_name(namespace, level)
+    return namespace
 
 @st.cache_data
-def load_data_from_meteo_snow(year):
-    # Setup the Open-Meteo API client with cache and retry on error
-    cache_session = requests_cache.CachedSession('.cache', expire_after = 3600)
-    retry_session = retry(cache_session, retries = 5, backoff_factor = 0.2)
-    openmeteo = openmeteo_requests.Client(session = retry_session)
+def load_mean_by_pricearea(namespace, group, start_date, end_date):
+    """Mean quantitykwh per price area for a group and date range, computed in MongoDB"""
+    query = build_query(namespace, group, start_date, end_date)
+    source = _source(namespace, _rollup_level(start_date, end_date), start_date, end_date)
+    if source != namespace:
+        # Rollups keep the number of hours in each bucket, the mean is total over hours
+        pipeline = [
+            {'$match': query},
+            {'$group': {'_id': '$pricearea', 'quantitykwh': {'$sum': '$quantitykwh'}, 'count': {'$sum': '$count'}}},
+            {'$project': {'_id': 0, 'pricearea': '$_id', 'quantitykwh': {'$divide': ['$quantitykwh', '$count']}}},
+            {'$sort': {'pricearea': 1}}
+        ]
+        return _aggregate(source, pipeline)
+    pipeline = [
+        {'$match': query},
+        {'$group': {'_id': '$pricearea', 'quantitykwh': {'$avg': '$quantitykwh'}}},
+        {'$project': {'_id': 0, 'pricearea': '$_id', 'quantitykwh': 1}},
+        {'$sort': {'pricearea': 1}}
+    ]
+    return _aggregate(namespace, pipeline)
 
-    start = f'{year}-01-01'
-    end = f'{year}-12-31'
+@st.cache_data
+def load_production_totals():
+    """Total quantitykwh per price area and production group, computed in MongoDB"""
+    pipeline = [
+        {'$group': {
+            '_id': {'pricearea': '$pricearea', 'productiongroup': '$productiongroup'},
+            'quantitykwh': {'$sum': '$quantitykwh'}
+        }},
+        {'$project': {
+            '_id': 0,
+            'pricearea': '$_id.pricearea',
+            'productiongroup': '$_id.productiongroup',
+            'quantitykwh': 1
+        }},
+        {'$sort': {'pricearea': 1, 'productiongroup': 1}}
+    ]
+    return _aggregate(_source('production_NO1', 'monthly'), pipeline)
 
-    params = {
-    "latitude": st.session_state.clicked_lat, 
-    "longitude": st.session_state.clicked_lon,
-    "start_date": start,
-    "end_date": end,
-    "hourly": ["temperature_2m", "precipitation", "wind_speed_10m", "wind_gusts_10m", "wind_direction_10m"],
-    "models": "era5",
+@st.cache_data
+def load_production_months():
+    """Sorted list of months (YYYY-MM) present in the production collection"""
+    pipeline = [
+        {'$group': {'_id': {'$dateToString': {'format': '%Y-%m', 'date': '$starttime'}}}},
+        {'$sort': {'_id': 1}}
+    ]
+    collection = get_database()[_source('production_NO1', 'monthly')]
+    return [doc['_id'] for doc in collection.aggregate(pipeline)]
+
+@st.cache_data
+def load_production_hourly_sums(year_month):
+    """
+    Hourly quantitykwh per production group for one month (YYYY-MM),
+    summed over all price areas in MongoDB
+    """
+    start = pd.Period(year_month, freq='M')
+    pipeline = [
+        {'$match': {'starttime': {
+            '$gte': start.start_time.to_pydatetime(),
+            '$lt': (start + 1).start_time.to_pydatetime()
+        }}},
+        {'$group': {
+            '_id': {'productiongroup': '$productiongroup', 'starttime': '$starttime'},
+            'quantitykwh': {'$sum': '$quantitykwh'}
+        }},
+        {'$project': {
+            '_id': 0,
+            'productiongroup': '$_id.productiongroup',
+            'starttime': '$_id.starttime',
+            'quantitykwh': 1
+        }},
+        {'$sort': {'productiongroup': 1, 'starttime': 1}}
+    ]
+    return _aggregate('production_NO1', pipeline)
+
+@st.cache_data
+def load_daily_sums(namespace, group, pricearea, start_date, end_date):
+    """Daily quantitykwh for a group in one price area, summed in MongoDB"""
+    query = build_query(namespace, group, start_date, end_date)
+    query['pricearea'] = pricearea
+    pipeline = [
+        {'$match': query},
+        {'$project': {
+            '_id': 0,
+            'day': {'$dateToString': {'format': '%Y-%m-%d', 'date': '$starttime'}},
+            'quantitykwh': 1
+        }},
+        {'$group': {'_id': '$day', 'quantitykwh': {'$sum': '$quantitykwh'}}},
+        {'$project': {'_id': 0, 'starttime': '$_id', 'quantitykwh': 1}},
+        {'$sort': {'starttime': 1}}
+    ]
+    df = _aggregate(_source(namespace, 'daily', start_date, end_date, [pricearea]), pipeline)
+    if not df.empty:
+        df['starttime'] = pd.to_datetime(df['starttime']).dt.date
+    return df
+
+# Coordinates used for the weather data of each city
+CITIES = {
+    'Oslo': {
+        "price_area_code": "NO1",
+        "longitude": 10.7461,
+        "latitude": 59.9127
+    },
+    'Kristiansand': {
+        "price_area_code": "NO2",
+        "longitude": 7.9956,
+        "latitude": 58.1467
+    },
+    'Trondheim': {
+        "price_area_code": "NO3",
+        "longitude": 10.3951,
+        "latitude": 63.4305
+    },
+    'Tromsø': {
+        "price_area_code": "NO4",
+        "longitude": 18.9551,
+        "latitude": 69.6489
+    },
+    'Bergen': {
+        "price_area_code": "NO5",
+        "longitude": 5.3242,
+        "latitude": 60.393
     }
-    url = "https://archive-api.open-meteo.com/v1/archive"
-    responses = openmeteo.weather_api(url, params=params)
-    response = responses[0]
-    # Process hourly data. The order of variables needs to be the same as requested.
-    hourly = response.Hourly()
-    hourly_temperature_2m = hourly.Variables(0).ValuesAsNumpy()
-    hourly_precipitation = hourly.Variables(1).ValuesAsNumpy()
-    hourly_wind_speed_10m = hourly.Variables(2).ValuesAsNumpy()
-    hourly_wind_gusts_10m = hourly.Variables(3).ValuesAsNumpy()
-    hourly_wind_direction_10m = hourly.Variables(4).ValuesAsNumpy()
+}
 
-    hourly_data = {"date": pd.date_range(
+METEO_URL = "https://archive-api.open-meteo.com/v1/archive"
+
+# Hourly variables requested from Open-Meteo, in request order
+HOURLY_VARIABLES = ["temperature_2m", "precipitation", "wind_speed_10m", "wind_gusts_10m", "wind_direction_10m"]
+
+# Column names used by the snowdrift page for the hourly variables
+SNOW_COLUMNS = {
+    "temperature_2m": "temperature_2m (°C)",
+    "precipitation": "precipitation (mm)",
+    "wind_speed_10m": "wind_speed_10m (m/s)",
+    "wind_gusts_10m": "wind_gusts_10m",
+    "wind_direction_10m": "wind_direction_10m (°)"
+}
+
+# Resolution of the ERA5 reanalysis grid in degrees
+ERA5_GRID_STEP = 0.25
+
+def _openmeteo_client():
+    """Open-Meteo API client with retry on error, responses are kept in the weather store"""
+    retry_session = retry(requests.Session(), retries = 5, backoff_factor = 0.2)
+    return openmeteo_requests.Client(session = retry_session)
+
+def _decode_hourly(response):
+    """Decode the hourly block of one Open-Meteo response into (dates, arrays by variable)"""
+    hourly = response.Hourly()
+    dates = pd.date_range(
         start = pd.to_datetime(hourly.Time(), unit = "s", utc = True),
         end =  pd.to_datetime(hourly.TimeEnd(), unit = "s", utc = True),
         freq = pd.Timedelta(seconds = hourly.Interval()),
         inclusive = "left"
-    )}
+    )
+    # The order of variables is the same as requested
+    arrays = {variable: hourly.Variables(i).ValuesAsNumpy() for i, variable in enumerate(HOURLY_VARIABLES)}
+    return dates, arrays
 
-    hourly_data["temperature_2m (°C)"] = hourly_temperature_2m
-    hourly_data["precipitation (mm)"] = hourly_precipitation
-    hourly_data["wind_speed_10m (m/s)"] = hourly_wind_speed_10m
-    hourly_data["wind_gusts_10m"] = hourly_wind_gusts_10m
-    hourly_data["wind_direction_10m (°)"] = hourly_wind_direction_10m
+def _fetch_meteo(locations, start_year, end_year):
+    """
+    Fetch several (latitude, longitude) locations for all years from start_year to
+    end_year in a single archive request, and write the decoded years to the weather store.
+    Only the years in the list given for each location are written.
+    """
+    params = {
+    "latitude": [latitude for latitude, _ in locations],
+    "longitude": [longitude for _, longitude in locations],
+    "start_date": f'{start_year}-01-01',
+    "end_date": f'{end_year}-12-31',
+    "hourly": HOURLY_VARIABLES,
+    "models": "era5"
+    }
+    responses = _openmeteo_client().weather_api(METEO_URL, params=params)
+    for (location, years), response in zip(locations.items(), responses):
+        dates, arrays = _decode_hourly(response)
+        for year in years:
+            in_year = dates.year == year
+            weather_store.write(*location, year, dates[in_year], {v: a[in_year] for v, a in arrays.items()})
 
-    df = pd.DataFrame(data = hourly_data)
+def ensure_stored(locations, start_year, end_year):
+    """Fetch the years that are missing from the weather store, or due for a refresh, in one request"""
+    stale = {}
+    for latitude, longitude in locations:
+        missing = [year for year in range(start_year, end_year + 1)
+                   if not weather_store.is_fresh(latitude, longitude, year, HOURLY_VARIABLES)]
+        if missing:
+            stale[(latitude, longitude)] = missing
 
-    # Need to convert to float64 for the data to work in Streamlit
-    for col in df.select_dtypes(include=["float32", "float16"]).columns:
-        df[col] = df[col].astype("float64")
+    if stale:
+        first_year = min(min(years) for years in stale.values())
+        last_year = max(max(years) for years in stale.values())
+        _fetch_meteo(stale, first_year, last_year)
+
+def stored_view(latitude, longitude, start_year, end_year, columns=None):
+    """
+    Zero-copy DataFrame from the weather store for one location, with the variables
+    renamed by columns. A single year is a view on the read-only memory-mapped
+    arrays, so assigning to it raises; several years are concatenated once.
+    Only for read-only work, stored_frame returns a writable frame.
+    """
+    years = [weather_store.read(latitude, longitude, year, HOURLY_VARIABLES)
+             for year in range(start_year, end_year + 1)]
+    if len(years) == 1:
+        dates, arrays = years[0]
+    else:
+        dates = years[0][0].append([d for d, _ in years[1:]])
+        arrays = {v: np.concatenate([a[v] for _, a in years]) for v in HOURLY_VARIABLES}
 
+    columns = columns or {}
+    df = pd.DataFrame({columns.get(v, v): arrays[v] for v in HOURLY_VARIABLES}, copy=False)
+    df.insert(0, 'date', dates)
     return df
+
+def stored_frame(latitude, longitude, start_year, end_year, columns=None):
+    """Writable DataFrame from the weather store for one location, like stored_view"""
+    df = stored_view(latitude, longitude, start_year, end_year, columns)
+    # Only a single year is backed by the memory map, several years are already a fresh copy
+    return df.copy() if start_year == end_year else df
+
+def load_weather(locations, start_year, end_year, columns=None):
+    """
+    The single fetch path for hourly weather. Returns one DataFrame per
+    (latitude, longitude) in locations from start_year to end_year, with the
+    variables renamed by columns. Everything that is not stored yet is fetched
+    in one archive request, every page reads the same stored arrays.
+    """
+    ensure_stored(locations, start_year, end_year)
+    return [stored_frame(latitude, longitude, start_year, end_year, columns) for latitude, longitude in locations]
+
+def city_locations():
+    """(latitude, longitude) of every city in CITIES, in the same order"""
+    return [(c['latitude'], c['longitude']) for c in CITIES.values()]
+
+def load_data_from_meteo_all_cities(year):
+    """
+    Hourly weather for all five price area cities for one year, fetched in a
+    single archive request when not in the weather store. Returns a dict with
+    one DataFrame per city.
+    """
+    return dict(zip(CITIES, load_weather(city_locations(), year, year)))
+
+def load_data_from_meteo(year, city):
+    """Hourly weather for one city and year, stored together with the other cities"""
+    selected_city = CITIES[city]
+    ensure_stored(city_locations(), year, year)
+    return stored_frame(selected_city['latitude'], selected_city['longitude'], year, year)
+
+def load_data_from_meteo_range(start_year, end_year, city):
+    """Hourly weather for a city from start_year to end_year, in at most one round-trip"""
+    selected_city = CITIES[city]
+    return load_weather([(selected_city['latitude'], selected_city['longitude'])], start_year, end_year)[0]
+
+def snap_to_era5_grid(latitude, longitude):
+    """Return the centre (latitude, longitude) of the ERA5 grid cell containing the coordinates"""
+    def snap(value):
+        return round(round(value / ERA5_GRID_STEP) * ERA5_GRID_STEP, 4)
+    return snap(latitude), snap(longitude)
+
+def load_data_from_meteo_snow_range(start_year, end_year, latitude, longitude):
+    """
+    Hourly weather with the snowdrift column names from start_year to end_year,
+    in at most one round-trip. The coordinates are snapped to their ERA5 grid
+    cell first, so nearby clicks share the same stored data.
+    """
+    location = snap_to_era5_grid(latitude, longitude)
+    return load_weather([location], start_year, end_year, SNOW_COLUMNS)[0]
+
+def load_data_from_meteo_snow(year, latitude, longitude):
+    """Hourly weather with the snowdrift column names for one year, at the ERA5 grid cell of the coordinates"""
+    return load_data_from_meteo_snow_range(year, year, latitude, longitude)
@@ -0,0 +1,294 @@
+"""
+Offline load test for the MongoDB data layer in load_data.
+
+Seeds a local mongod (--uri) or an in-process mongomock database (--mock) with
+synthetic Elhub-shaped documents (starttime, pricearea, group, quantitykwh)
+for 1 to 20 years, then drives the loaders outside Streamlit and reports
+throughput, latency percentiles and peak RSS per scenario.
+
+mongomock scans every document in Python, so --mock seeds one price area and
+one group per namespace unless --areas and --groups say otherwise. Its numbers
+only show that the scenarios run, not how fast MongoDB is.
+
+Every call starts cold: the Streamlit caches and the local Parquet cache are
+cleared before each iteration, so the numbers measure the MongoDB round-trip
+and decoding. Results can be saved with --save and compared against an earlier
+run with --baseline, which exits with status 1 on a regression.
+
+Usage:
+    python load_test.py --uri mongodb://localhost:27017 --years 5 --iterations 20
+    python load_test.py --mock --years 1 --iterations 5
+    python load_test.py --uri mongodb://localhost:27017 --years 1 --areas NO1 NO2 --groups 2
+    python load_test.py --uri mongodb://localhost:27017 --years 5 --save base.json
+    python load_test.py --uri mongodb://localhost:27017 --years 5 --baseline base.json
+"""
+
+import argparse
+import json
+import random
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import energy_cache
+import load_data
+from energy_schema import PRICE_AREAS, group_field
+from mongo_client import use_database
+
+# Groups seeded in each namespace
+GROUPS = {
+    "production_NO1": ["hydro", "other", "solar", "thermal", "wind"],
+    "consumption_NO1": ["cabin", "household", "primary", "secondary", "tertiary"],
+}
+FIRST_YEAR = 2021
+BATCH_SIZE = 50_000
+
+
+def _max_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return rss / 2**20 if sys.platform == "darwin" else rss / 2**10
+
+
+def synthetic_documents(namespace, years, areas=PRICE_AREAS, groups=None, seed=0):
+    """Yield batches of hourly Elhub-shaped documents for every given price area and group."""
+    field = group_field(namespace)
+    rng = np.random.default_rng(seed)
+    hours = pd.date_range(f"{FIRST_YEAR}-01-01", f"{FIRST_YEAR + years}-01-01", freq="h", inclusive="left")
+    day_cycle = 1 + 0.2 * np.sin(2 * np.pi * hours.hour.to_numpy() / 24)
+    year_cycle = 1 + 0.5 * np.cos(2 * np.pi * hours.dayofyear.to_numpy() / 365.25)
+    starttimes = hours.to_pydatetime()
+
+    batch = []
+    for area in areas:
+        for group in groups or GROUPS[namespace]:
+            base = rng.uniform(1e4, 5e6)
+            values = base * day_cycle * year_cycle * rng.lognormal(0, 0.1, len(hours))
+            for starttime, value in zip(starttimes, values):
+                batch.append({
+                    "starttime": starttime,
+                    "pricearea": area,
+                    field: group,
+                    "quantitykwh": float(value),
+                })
+                if len(batch) == BATCH_SIZE:
+                    yield batch
+                    batch = []
+    if batch:
+        yield batch
+
+
+def seed(db, years, areas=PRICE_AREAS, groups=GROUPS):
+    """Replace the energy collections in db with synthetic data for the given number of years."""
+    for namespace in groups:
+        db[namespace].drop()
+        n = 0
+        for batch in synthetic_documents(namespace, years, areas, groups[namespace]):
+            db[namespace].insert_many(batch, ordered=False)
+            n += len(batch)
+        print(f"Seeded {namespace} with {n} documents")
+
+
+def _random_range(rng, years):
+    """Random date range of 1 month to the full span, inside the seeded years."""
+    first = date(FIRST_YEAR, 1, 1)
+    total_days = (date(FIRST_YEAR + years, 1, 1) - first).days
+    length = rng.randint(30, total_days)
+    start = first + timedelta(days=rng.randint(0, total_days - length))
+    return start, start + timedelta(days=length - 1)
+
+
+def scenarios(years, areas=PRICE_AREAS, groups=GROUPS):
+    """
+    Named loader calls on the seeded price areas and groups.
+    Each takes a random.Random and returns the number of rows produced.
+    """
+    def find_range(rng):
+        namespace = rng.choice(list(groups))
+        start, end = _random_range(rng, years)
+        return len(load_data.load_data_from_mongodb(namespace, rng.choice(groups[namespace]), start, end))
+
+    def find_all(rng):
+        return len(load_data.load_data_from_mongodb_no_arguments())
+
+    def mean_by_area(rng):
+        namespace = rng.choice(list(groups))
+        start, end = _random_range(rng, years)
+        return len(load_data.load_mean_by_pricearea(namespace, rng.choice(groups[namespace]), start, end))
+
+    def daily_sums(rng):
+        namespace = rng.choice(list(groups))
+        start, end = _random_range(rng, years)
+        group = rng.choice(groups[namespace])
+        return len(load_data.load_daily_sums(namespace, group, rng.choice(areas), start, end))
+
+    def production_totals(rng):
+        return len(load_data.load_production_totals())
+
+    def hourly_sums(rng):
+        year_month = f"{rng.randint(FIRST_YEAR, FIRST_YEAR + years - 1)}-{rng.randint(1, 12):02d}"
+        return len(load_data.load_production_hourly_sums(year_month))
+
+    def stream_fold(rng):
+        totals, = load_data.fold_chunks(load_data.iter_production_chunks(), load_data.SumFold("starttime"))
+        return len(totals)
+
+    return {
+        "load_data_from_mongodb": find_range,
+        "load_data_from_mongodb_no_arguments": find_all,
+        "load_mean_by_pricearea": mean_by_area,
+        "load_daily_sums": daily_sums,
+        "load_production_totals": production_totals,
+        "load_production_hourly_sums": hourly_sums,
+        "iter_production_chunks": stream_fold,
+    }
+
+
+def _clear_caches():
+    for loader in (
+        load_data.load_data_from_mongodb,
+        load_data.load_data_from_mongodb_no_arguments,
+        load_data.load_mean_by_pricearea,
+        load_data.load_daily_sums,
+        load_data.load_production_totals,
+        load_data.load_production_hourly_sums,
+    ):
+        loader.clear()
+    energy_cache.clear()
+
+
+def run_scenario(call, iterations, threads, seed_value):
+    """Run one scenario and return its latency, throughput and memory figures."""
+    rss_before = _max_rss_mb()
+    latencies = []
+    rows = 0
+
+    def one(i):
+        rng = random.Random(seed_value + i)
+        start = time.perf_counter()
+        n = call(rng)
+        return time.perf_counter() - start, n
+
+    start = time.perf_counter()
+    if threads == 1:
+        for i in range(iterations):
+            _clear_caches()
+            latency, n = one(i)
+            latencies.append(latency)
+            rows += n
+    else:
+        # Concurrent sessions, the caches are cleared once per round
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            for round_start in range(0, iterations, threads):
+                _clear_caches()
+                batch = range(round_start, min(round_start + threads, iterations))
+                for latency, n in pool.map(one, batch):
+                    latencies.append(latency)
+                    rows += n
+    elapsed = time.perf_counter() - start
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "calls": iterations,
+        "calls_per_s": iterations / elapsed,
+        "rows_per_s": rows / elapsed,
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p95_ms": float(np.percentile(latencies_ms, 95)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+        "peak_rss_mb": _max_rss_mb(),
+        "rss_growth_mb": _max_rss_mb() - rss_before,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Return the scenarios whose p95 latency or RSS growth got worse than baseline by more than tolerance."""
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        for metric in ("p95_ms", "rss_growth_mb"):
+            before, after = baseline[name][metric], result[metric]
+            if before > 0 and after > before * (1 + tolerance):
+                regressions.append(f"{name}: {metric} {before:.1f} -> {after:.1f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--uri", help="MongoDB URI of a local mongod")
+    target.add_argument("--mock", action="store_true", help="Use an in-process mongomock database")
+    parser.add_argument("--database", default="IND320_loadtest")
+    parser.add_argument("--years", type=int, default=1, choices=range(1, 21), metavar="1-20")
+    parser.add_argument("--areas", nargs="+", choices=PRICE_AREAS,
+                        help="Price areas to seed, all of them by default and NO1 with --mock")
+    parser.add_argument("--groups", type=int, choices=range(1, 6), metavar="1-5",
+                        help="Groups to seed per namespace, all five by default and one with --mock")
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--threads", type=int, default=1, help="Concurrent sessions")
+    parser.add_argument("--scenarios", nargs="+", help="Only run these scenarios")
+    parser.add_argument("--no-seed", action="store_true", help="Reuse the data already in the database")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the random query ranges")
+    parser.add_argument("--save", type=Path, help="Write the results as JSON")
+    parser.add_argument("--baseline", type=Path, help="Compare against results saved with --save")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression")
+    args = parser.parse_args()
+
+    if args.mock:
+        import mongomock
+        # mongomock cannot decode raw BSON batches
+        load_data.find_arrow_all = None
+        db = mongomock.MongoClient()[args.database]
+    else:
+        from pymongo import MongoClient
+        db = MongoClient(args.uri)[args.database]
+    use_database(db)
+
+    # Keep the Parquet cache of the load test away from the app's cache
+    energy_cache.CACHE_DIR = Path(tempfile.mkdtemp(prefix="energy_cache_loadtest_"))
+
+    areas = args.areas or (["NO1"] if args.mock else PRICE_AREAS)
+    n_groups = args.groups or (1 if args.mock else None)
+    groups = {namespace: names[:n_groups] for namespace, names in GROUPS.items()}
+    if not args.no_seed:
+        seed(db, args.years, areas, groups)
+
+    all_scenarios = scenarios(args.years, areas, groups)
+    selected = args.scenarios or list(all_scenarios)
+    results = {}
+    print(f"{'scenario':<38} {'calls/s':>8} {'rows/s':>11} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'peak RSS MB':>12}")
+    for name in selected:
+        result = run_scenario(all_scenarios[name], args.iterations, args.threads, args.seed)
+        results[name] = result
+        print(
+            f"{name:<38} {result['calls_per_s']:>8.2f} {result['rows_per_s']:>11.1f} {result['p50_ms']:>9.1f} "
+            f"{result['p95_ms']:>9.1f} {result['p99_ms']:>9.1f} {result['peak_rss_mb']:>12.1f}"
+        )
+    energy_cache.clear()
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(
+                {"years": args.years, "areas": areas, "groups": n_groups, "threads": args.threads, "results": results},
+                f, indent=2,
+            )
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Local Outlier Factor for one-dimensional data.
+
+Gives the same scores and labels as sklearn's LocalOutlierFactor(n_neighbors,
+contamination).fit_predict on a single column, but finds the neighbours
+from the sorted values instead of a generic tree search. After sorting, the
+k nearest neighbours of a value are always k+1 consecutive values that
+include it, so only the k+1 windows around each value need to be compared.
+Everything runs as array operations, O(n log n) for the sort and O(n k)
+after it.
+
+When the values on both sides of a point are at the same distance, more
+than one set of k neighbours is valid. sklearn picks one by the order of its
+tree search and this module keeps the leftmost window, so the scores of such
+points can differ. On continuous data the labels are identical. On
+precipitation rounded to 0.1 mm, a few dozen hours in a year can be labelled
+differently, all close to the contamination threshold.
+"""
+
+import numpy as np
+
+
+def _sorted_neighbors(s, k):
+    """
+    k nearest neighbours of every element of the sorted array s, excluding itself.
+    Returns (positions of the neighbours in s, distances, k-distance).
+    """
+    n = len(s)
+    i = np.arange(n)
+
+    # Candidate window t starts at i - t and ends at i - t + k, for t = 0..k
+    best_start = np.zeros(n, dtype=np.intp)
+    best_kdist = np.full(n, np.inf)
+    for t in range(k + 1):
+        start = i - t
+        valid = (start >= 0) & (start + k < n)
+        left = s[np.clip(start, 0, n - 1)]
+        right = s[np.clip(start + k, 0, n - 1)]
+        kdist = np.where(valid, np.maximum(s - left, right - s), np.inf)
+        # <= keeps the leftmost of equally good windows
+        better = kdist <= best_kdist
+        best_start[better] = start[better]
+        best_kdist[better] = kdist[better]
+
+    window = best_start[:, None] + np.arange(k + 1)
+    neighbors = window[window != i[:, None]].reshape(n, k)
+    distances = np.abs(s[neighbors] - s[:, None])
+    return neighbors, distances, distances.max(axis=1)
+
+
+def local_outlier_factor(x, n_neighbors=20):
+    """Negative local outlier factor of every value of x, like sklearn's negative_outlier_factor_."""
+    x = np.asarray(x, dtype=float).ravel()
+    n = len(x)
+    k = max(1, min(n_neighbors, n - 1))
+
+    order = np.argsort(x, kind='stable')
+    s = x[order]
+    neighbors, distances, kdist = _sorted_neighbors(s, k)
+
+    reach = np.maximum(distances, kdist[neighbors])
+    # 1e-10 to avoid dividing by zero when more than k values are equal, as in sklearn
+    lrd = 1.0 / (reach.mean(axis=1) + 1e-10)
+    lof = np.mean(lrd[neighbors] / lrd[:, None], axis=1)
+
+    negative_outlier_factor = np.empty(n)
+    negative_outlier_factor[order] = -lof
+    return negative_outlier_factor
+
+
+def lof_fit_predict(x, n_neighbors=20, contamination=0.01):
+    """
+    Labels like LocalOutlierFactor(n_neighbors, contamination=contamination).fit_predict:
+    -1 for outliers, 1 for inliers. Returns (labels, negative_outlier_factor).
+    """
+    negative_outlier_factor = local_outlier_factor(x, n_neighbors)
+    return lof_labels(negative_outlier_factor, contamination), negative_outlier_factor
+
+
+def lof_labels(negative_outlier_factor, contamination=0.01):
+    """-1 for the contamination share of values with the lowest scores, 1 for the rest."""
+    offset = np.percentile(negative_outlier_factor, 100.0 * contamination)
+    return np.where(negative_outlier_factor < offset, -1, 1)
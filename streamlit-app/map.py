@@ -4,7 +4,7 @@ from datetime import date
 from folium import GeoJson
 from shapely.geometry import shape, Point
 from streamlit_folium import st_folium
-from load_data import load_json, load_data_from_mongodb
+from load_data import load_json, load_mean_by_pricearea
 import pandas as pd
 import geopandas as gpd
 from pathlib import Path 
@@ -77,14 +77,15 @@ def controls():
             st.error("Please enter a group name")
         else:
             with st.spinner("Querying database..."):
-                st.session_state.query_results = load_data_from_mongodb(
+                # Mean per price area is computed inside MongoDB
+                st.session_state.query_results = load_mean_by_pricearea(
                     namespace,
                     st.session_state.group_selected,
                     from_date,
                     to_date
                 )
                 
-                st.success(f"Found {len(st.session_state.query_results)} records")
+                st.success(f"Found data for {len(st.session_state.query_results)} price areas")
 
 def choropleth():
 
@@ -105,12 +106,8 @@ def choropleth():
 
     # Check if query results exist
     try:
-        df = st.session_state.query_results
-        
-        # Aggregate data by pricearea - calculate mean quantitykwh
-        aggregated_data = df.groupby('pricearea').agg({
-            'quantitykwh': 'mean'
-        }).reset_index()
+        # Query results are already aggregated by pricearea (mean quantitykwh)
+        aggregated_data = st.session_state.query_results.copy()
         
         # Add a column with space to match GeoJSON format "NO 1"
         aggregated_data['pricearea_with_space'] = aggregated_data['pricearea'].str.replace('NO', 'NO ')
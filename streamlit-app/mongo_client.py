@@ -0,0 +1,139 @@
+"""
+Process-wide MongoDB client shared by all loaders.
+
+The client is created once per process through st.cache_resource, so every
+session and every query reuses the same connection pool instead of doing a new
+TLS/SRV handshake. The pool size is read from st.secrets["mongo"]["max_pool_size"].
+"""
+
+import threading
+import time
+
+import streamlit as st
+from pymongo import MongoClient, monitoring
+
+DEFAULT_MAX_POOL_SIZE = 50
+
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    """Connection pool listener keeping counters for sizing the pool."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.checkout_failures = 0
+            self.total_wait = 0.0
+            self.max_wait = 0.0
+            self.active_connections = 0
+            self.max_active_connections = 0
+            self.open_connections = 0
+
+    def snapshot(self):
+        """Return the current counters as a dict."""
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "total_wait_s": self.total_wait,
+                "mean_wait_s": self.total_wait / self.checkouts if self.checkouts else 0.0,
+                "max_wait_s": self.max_wait,
+                "active_connections": self.active_connections,
+                "max_active_connections": self.max_active_connections,
+                "open_connections": self.open_connections,
+            }
+
+    def _wait_time(self):
+        started = getattr(self._local, "started", None)
+        self._local.started = None
+        return time.perf_counter() - started if started is not None else 0.0
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        wait = self._wait_time()
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            self.active_connections += 1
+            self.max_active_connections = max(self.max_active_connections, self.active_connections)
+
+    def connection_check_out_failed(self, event):
+        wait = self._wait_time()
+        with self._lock:
+            self.checkout_failures += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.active_connections -= 1
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open_connections += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open_connections -= 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+
+pool_stats = PoolStats()
+
+# Database used instead of the configured one, set through use_database
+_database_override = None
+
+
+@st.cache_resource
+def get_mongo_client():
+    """Return the shared MongoClient for this process."""
+    config = st.secrets["mongo"]
+    max_pool_size = int(config.get("max_pool_size", DEFAULT_MAX_POOL_SIZE))
+    return MongoClient(
+        config["uri"],
+        maxPoolSize=max_pool_size,
+        event_listeners=[pool_stats],
+    )
+
+
+def get_database():
+    """Return the configured database on the shared client."""
+    if _database_override is not None:
+        return _database_override
+    return get_mongo_client()[st.secrets["mongo"]["database"]]
+
+
+def use_database(db):
+    """
+    Point every loader at db instead of the database configured in st.secrets,
+    e.g. a local mongod or an in-process mock when running outside Streamlit.
+    Pass None to go back to the configured database.
+    """
+    global _database_override
+    _database_override = db
+
+
+def pool_statistics():
+    """Return checkout, wait time and connection counters for the shared pool."""
+    return pool_stats.snapshot()
@@ -0,0 +1,169 @@
+"""
+Index management and query plan report for the energy collections.
+
+Creates the compound indexes matching the access patterns in load_data and
+runs explain() on the real query shapes, reporting keys and documents
+examined against documents returned, the winning plan and the latency.
+
+Usage:
+    python mongo_indexes.py create  --uri mongodb://localhost:27017 --database IND320
+    python mongo_indexes.py explain --uri mongodb://localhost:27017 --database IND320
+    python mongo_indexes.py drop    --uri mongodb://localhost:27017 --database IND320
+"""
+
+import argparse
+import time
+from datetime import date, datetime
+
+from pymongo import ASCENDING, MongoClient
+
+from energy_schema import GROUP_FIELDS, build_query, group_field
+
+NAMESPACES = list(GROUP_FIELDS)
+
+# Example group for each namespace used in the explained query shapes
+EXAMPLE_GROUPS = {"production_NO1": "hydro", "consumption_NO1": "household"}
+
+
+def index_specs(namespace):
+    """Indexes for one namespace as (name, keys, options) tuples."""
+    group = group_field(namespace)
+    return [
+        # Group and date range, with or without a price area (map, SARIMAX, correlation pages).
+        # Also the key of the ingestion upserts, unique so concurrent upserts cannot insert the same hour twice
+        (
+            f"{group}_pricearea_starttime",
+            [(group, ASCENDING), ("pricearea", ASCENDING), ("starttime", ASCENDING)],
+            {"unique": True},
+        ),
+        # Time windows over all groups (monthly line plot and the streaming loader)
+        ("starttime", [("starttime", ASCENDING)], {}),
+    ]
+
+
+def ensure_index(collection, name, keys, options):
+    """
+    Create an index, replacing an existing one of the same name created with other
+    options (such as the non-unique key index of older databases).
+    """
+    existing = collection.index_information().get(name)
+    if existing is not None and any(existing.get(option) != value for option, value in options.items()):
+        collection.drop_index(name)
+    collection.create_index(keys, name=name, **options)
+
+
+def query_shapes(namespace, start_date, end_date):
+    """The filters load_data sends to MongoDB, as (name, filter) pairs."""
+    group = EXAMPLE_GROUPS[namespace]
+    with_area = build_query(namespace, group, start_date, end_date)
+    with_area["pricearea"] = "NO1"
+    month_start = datetime(start_date.year, start_date.month, 1)
+    month_end = datetime(start_date.year + start_date.month // 12, start_date.month % 12 + 1, 1)
+    return [
+        ("group", build_query(namespace, group)),
+        ("group + range", build_query(namespace, group, start_date, end_date)),
+        ("group + area + range", with_area),
+        ("month window", {"starttime": {"$gte": month_start, "$lt": month_end}}),
+    ]
+
+
+def create_indexes(db):
+    for namespace in NAMESPACES:
+        for name, keys, options in index_specs(namespace):
+            ensure_index(db[namespace], name, keys, options)
+            print(f"{namespace}: created {name}")
+
+
+def drop_indexes(db):
+    for namespace in NAMESPACES:
+        existing = db[namespace].index_information()
+        for name, _, _ in index_specs(namespace):
+            if name in existing:
+                db[namespace].drop_index(name)
+                print(f"{namespace}: dropped {name}")
+
+
+def _find_key(document, key):
+    """Depth-first search for the first value stored under key in a nested explain document."""
+    if isinstance(document, dict):
+        if key in document:
+            return document[key]
+        children = document.values()
+    elif isinstance(document, list):
+        children = document
+    else:
+        return None
+    for child in children:
+        found = _find_key(child, key)
+        if found is not None:
+            return found
+    return None
+
+
+def _winning_plan(plan):
+    """Short description of a winning plan, e.g. IXSCAN(productiongroup_pricearea_starttime)."""
+    index_name = _find_key(plan, "indexName")
+    stage = "IXSCAN" if index_name else _find_key(plan, "stage")
+    return f"{stage}({index_name})" if index_name else str(stage)
+
+
+def explain_shape(db, namespace, query):
+    """Run explain with executionStats and a timed find for one filter."""
+    explain = db.command(
+        {"explain": {"find": namespace, "filter": query}, "verbosity": "executionStats"}
+    )
+    stats = _find_key(explain, "executionStats")
+
+    projection = {"_id": 0, "pricearea": 1, group_field(namespace): 1, "starttime": 1, "quantitykwh": 1}
+    start = time.perf_counter()
+    returned = len(list(db[namespace].find(query, projection)))
+    wall_ms = (time.perf_counter() - start) * 1000
+
+    return {
+        "plan": _winning_plan(_find_key(explain, "winningPlan")),
+        "keys_examined": stats["totalKeysExamined"],
+        "docs_examined": stats["totalDocsExamined"],
+        "returned": returned,
+        "server_ms": stats["executionTimeMillis"],
+        "wall_ms": wall_ms,
+    }
+
+
+def explain_all(db, start_date, end_date):
+    header = f"{'namespace':<16} {'query':<22} {'plan':<50} {'keys':>9} {'docs':>9} {'returned':>9} {'ratio':>6} {'server ms':>10} {'wall ms':>9}"
+    print(header)
+    print("-" * len(header))
+    for namespace in NAMESPACES:
+        for name, query in query_shapes(namespace, start_date, end_date):
+            r = explain_shape(db, namespace, query)
+            ratio = r["docs_examined"] / r["returned"] if r["returned"] else float("nan")
+            print(
+                f"{namespace:<16} {name:<22} {r['plan']:<50} {r['keys_examined']:>9} {r['docs_examined']:>9} "
+                f"{r['returned']:>9} {ratio:>6.2f} {r['server_ms']:>10} {r['wall_ms']:>9.1f}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["create", "drop", "explain"])
+    parser.add_argument("--uri", default="mongodb://localhost:27017")
+    parser.add_argument("--database", default="IND320")
+    parser.add_argument("--start", type=date.fromisoformat, default=date(2021, 1, 1),
+                        help="Start of the date range in the explained queries")
+    parser.add_argument("--end", type=date.fromisoformat, default=date(2021, 12, 31),
+                        help="End of the date range in the explained queries")
+    args = parser.parse_args()
+
+    client = MongoClient(args.uri)
+    db = client[args.database]
+    if args.command == "create":
+        create_indexes(db)
+    elif args.command == "drop":
+        drop_indexes(db)
+    else:
+        explain_all(db, args.start, args.end)
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
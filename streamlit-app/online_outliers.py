@@ -0,0 +1,126 @@
+"""
+Online outlier detection for hourly weather, one observation at a time.
+
+The outlier page detects outliers over a whole year at once: a DCT high-pass
+with MAD limits for temperature and a Local Outlier Factor for precipitation.
+The detectors here do the same kind of analysis incrementally, with O(1) work
+per hour, so appending newly arrived hours does not recompute the year:
+ - OnlineSPC: temperature minus an exponentially weighted mean (the online
+   high-pass), flagged when it lies more than k MADs from its median. The
+   median and the MAD are running P-squared quantiles from river.
+ - OnlineDensity: precipitation binned into a histogram whose counts decay
+   over time. An hour is flagged when the density of its bin is among the
+   lowest outlier_fraction of the densities seen so far.
+
+Every hour is scored against the state before it, and then learned. OnlineStream
+keeps both detectors and their results for one city, so the page can store it
+in st.session_state and only feed it the hours after the last one it has seen.
+"""
+
+import math
+
+import pandas as pd
+from river import stats
+
+
+class OnlineSPC:
+    """Rolling robust z-score of the high-passed series."""
+
+    def __init__(self, span_hours=168, k=3.0, warmup_hours=168):
+        # Same smoothing as a pandas ewm(span=span_hours)
+        self.baseline = stats.EWMean(fading_factor=2 / (span_hours + 1))
+        self.median = stats.Quantile(0.5)
+        self.mad = stats.Quantile(0.5)
+        self.k = k
+        self.warmup_hours = warmup_hours
+        self.n = 0
+
+    def update(self, x):
+        """Score x, learn it and return (seasonal baseline, is_outlier)."""
+        baseline = self.baseline.get() if self.n else x
+        highpass = x - baseline
+        median = self.median.get()
+        mad = self.mad.get()
+
+        is_outlier = (
+            self.n >= self.warmup_hours
+            and abs(highpass - median) > self.k * mad
+        )
+
+        self.baseline.update(x)
+        self.median.update(highpass)
+        self.mad.update(abs(highpass - (median if median is not None else highpass)))
+        self.n += 1
+        return baseline, is_outlier
+
+
+class OnlineDensity:
+    """Density of a value from a histogram with exponentially decaying counts."""
+
+    def __init__(self, bin_width=0.1, half_life_hours=24 * 90, outlier_fraction=0.01, warmup_hours=168):
+        self.bin_width = bin_width
+        self.decay = 0.5 ** (1 / half_life_hours)
+        self.threshold = stats.Quantile(outlier_fraction)
+        self.warmup_hours = warmup_hours
+        self.n = 0
+        # Instead of decaying every bin each hour, new observations get an ever larger weight
+        self._weight = 1.0
+        self._counts = {}
+        self._total = 0.0
+
+    def update(self, x):
+        """Score x, learn it and return (density of its bin, is_outlier)."""
+        bin_index = math.floor(x / self.bin_width)
+        density = self._counts.get(bin_index, 0.0) / self._total if self._total else 0.0
+        threshold = self.threshold.get()
+
+        is_outlier = self.n >= self.warmup_hours and density <= threshold
+
+        self.threshold.update(density)
+        self._counts[bin_index] = self._counts.get(bin_index, 0.0) + self._weight
+        self._total += self._weight
+        self._weight /= self.decay
+        if self._weight > 1e100:
+            self._rescale()
+        self.n += 1
+        return density, is_outlier
+
+    def _rescale(self):
+        """Bring the weights back to around 1, which only happens every few hundred thousand hours."""
+        self._counts = {b: c / self._weight for b, c in self._counts.items()}
+        self._total /= self._weight
+        self._weight = 1.0
+
+
+class OnlineStream:
+    """Both detectors and their results for one hourly weather series."""
+
+    def __init__(self, k=3.0, outlier_fraction=0.01):
+        self.temperature = OnlineSPC(k=k)
+        self.precipitation = OnlineDensity(outlier_fraction=outlier_fraction)
+        self.last_date = None
+        self._rows = []
+
+    def append(self, df):
+        """Feed the hours of df after the last one seen. Returns the number of new hours."""
+        if self.last_date is not None:
+            df = df[df['date'] > self.last_date]
+        for date, temperature, precipitation in zip(
+            df['date'], df['temperature_2m'].to_numpy(dtype=float), df['precipitation'].to_numpy(dtype=float)
+        ):
+            baseline, temperature_outlier = self.temperature.update(temperature)
+            density, precipitation_outlier = self.precipitation.update(precipitation)
+            self._rows.append((
+                date, temperature, baseline, temperature_outlier,
+                precipitation, density, precipitation_outlier,
+            ))
+        if len(df):
+            self.last_date = df['date'].iloc[-1]
+        return len(df)
+
+    def frame(self):
+        """Results of every hour seen, one row per hour."""
+        return pd.DataFrame(self._rows, columns=[
+            'date', 'temperature_2m', 'seasonal', 'temperature_outlier',
+            'precipitation', 'density', 'precipitation_outlier',
+        ]).astype({'temperature_outlier': bool, 'precipitation_outlier': bool})
@@ -4,7 +4,7 @@ import statsmodels.api as sm
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import date
-from load_data import load_data_from_mongodb
+from load_data import load_daily_sums
 
 def sarimax():
 
@@ -89,26 +89,22 @@ def sarimax():
             st.error("Please enter a group name")
         else:
             with st.spinner("Querying database..."):
-                st.session_state.df = load_data_from_mongodb(
+                # Daily sums for the selected price area are computed inside MongoDB
+                st.session_state.df = load_daily_sums(
                     namespace,
                     st.session_state.group_selected,
+                    st.session_state.selected_pricearea,
                     from_date,
                     to_date
                 )
-
-                # Subset the dataframe for selected price area
-                st.session_state.df = st.session_state.df[st.session_state.df['pricearea'] == st.session_state.selected_pricearea]
-                st.success(f"Found {len(st.session_state.df)} records")
+                st.success(f"Found {len(st.session_state.df)} days")
     
     # Only process the dataframe if it exists
     if st.session_state.df is not None:
 
-        # Ensure starttime is in datetime format
+        # Rows are already daily sums from MongoDB, ensure starttime is in datetime format
         st.session_state.df['starttime'] = pd.to_datetime(st.session_state.df['starttime'])
 
-        # Group by date and sum quantitykwh
-        st.session_state.df = st.session_state.df.groupby(st.session_state.df['starttime'].dt.date)['quantitykwh'].sum().reset_index()
-
         # Setting parameters
         st.subheader("SARIMAX Parameters")
 
@@ -2,7 +2,8 @@ import streamlit as st
 import pandas as pd
 import plotly.graph_objects as go
 from datetime import date
-from load_data import load_data_from_mongodb, load_data_from_meteo
+from load_data import load_data_from_mongodb, load_data_from_meteo_range
+from frame_schema import to_chart_frame
 
 # Initialize session state for storing results
 if 'energy_data' not in st.session_state:
@@ -109,20 +110,17 @@ def sliding_window_correlation():
                     date(end_year, 12, 31)
                 )
                 
-                years = []
-                for year in range(start_year, end_year+1):
-                    years.append(year)
-                data = [load_data_from_meteo(year, st.session_state.selected_city) for year in years]
-                st.session_state.weather = pd.concat(data)
+                # All selected years in one archive request
+                st.session_state.weather = load_data_from_meteo_range(start_year, end_year, st.session_state.selected_city)
                 st.success(f"Found {len(st.session_state.weather)+len(st.session_state.energy_data)} records")
         
         if st.session_state.energy_data is not None and st.session_state.weather is not None:
             
             # Filter on selected price_area or meteorological property
-            energy_data = st.session_state.energy_data.copy()
+            energy_data = to_chart_frame(st.session_state.energy_data)
             energy_data = energy_data[energy_data['pricearea']==cities[st.session_state.selected_city]]
             energy_data = energy_data[['starttime', st.session_state.energy_var]]
-            weather_data = st.session_state.weather.copy()
+            weather_data = to_chart_frame(st.session_state.weather)
             weather_data = weather_data[['date', st.session_state.met_var]]         
 
             # Standardize datetime
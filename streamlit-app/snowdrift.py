@@ -1,11 +1,28 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
+import plotly.express as px
+import folium
+import branca.colormap as cm
+from streamlit_folium import st_folium
 import snowdrift_utilities as sd
-from load_data import load_data_from_meteo_snow
+import snowdrift_region
+from load_data import load_data_from_meteo_snow_range, snap_to_era5_grid
 
 # Initialize session state for storing results
 if 'weather_data' not in st.session_state:
     st.session_state.weather_data = None
+if 'region_results' not in st.session_state:
+    st.session_state.region_results = None
+if 'site_comparison' not in st.session_state:
+    st.session_state.site_comparison = None
+
+# Example mountain passes for the site comparison
+DEFAULT_SITES = pd.DataFrame({
+    'Site': ['Haukelifjell', 'Hardangervidda', 'Filefjell', 'Valdresflye', 'Saltfjellet'],
+    'Latitude': [59.83, 60.43, 61.18, 61.38, 66.62],
+    'Longitude': [7.21, 7.55, 8.13, 8.82, 15.40]
+})
     
 
 def calculate_snowdrift():
@@ -14,63 +31,180 @@ def calculate_snowdrift():
     st.write("The snowdrift will be calculated for the location you picked on the map on the previuos page.")
    
 
-    try:
-        st.write(f"Latitude: {st.session_state.clicked_lat:.6f}")
-        st.write(f"Longitude: {st.session_state.clicked_lon:.6f}")
-        st.write("Please select the desired range of years you want to calculate snow drift.")
-
-        # Year range selection
-        start_year, end_year = st.slider(
-            "Select year range",
-            min_value=2015,
-            max_value=2023,
-            value=(2022, 2023),
-            step=1
-        )
-
-        years = list(range(start_year, end_year+2))
-
-        # Query Meteo
-        if st.button("Query Data"):
-            with st.spinner("Querying Meteo API..."):
-                data = [load_data_from_meteo_snow(year) for year in years]
-                st.session_state.weather_data = pd.concat(data)
-                st.success(f"Found {len(st.session_state.weather_data)} records")
-                
-
-        if st.session_state.weather_data is not None:
-            # Extract month from date column
-            st.session_state.weather_data['date'] = (st.session_state.weather_data['date'].dt.tz_localize(None))
-            st.session_state.weather_data['date'] = pd.to_datetime(st.session_state.weather_data['date'])
-            st.session_state.weather_data['month'] = st.session_state.weather_data['date'].dt.month
-            
-            # Define season: if month >= 7, season = current year; otherwise, season = previous year.
-            st.session_state.weather_data['season'] = st.session_state.weather_data['date'].apply(lambda dt: dt.year if dt.month >= 7 else dt.year - 1)
-
-            # Parameters for the snow transport calculation.
-            T = 3000      # Maximum transport distance in meters
-            F = 30000     # Fetch distance in meters
-            theta = 0.5   # Relocation coefficient
-
-
-            # Compute seasonal results (yearly averages for each season).
-            yearly_df = sd.compute_yearly_results(st.session_state.weather_data, T, F, theta)
-            overall_avg = yearly_df['Qt (kg/m)'].mean()
-            st.write(f"Overall average Qt over all seasons: {overall_avg / 1000:.1f} tonnes/m")
-            
-            yearly_df_disp = yearly_df.copy()
-            yearly_df_disp["Qt (tonnes/m)"] = yearly_df_disp["Qt (kg/m)"] / 1000
-            
-            # Compute the average directional breakdown (average over all seasons).
-            avg_sectors = sd.compute_average_sector(st.session_state.weather_data)
-            
-            # Create the rose plot canvas with the average directional breakdown.
-            fig = sd.plot_rose_plotly(avg_sectors, overall_avg)
-            st.plotly_chart(fig, use_container_width=True)
-
-    except:
+    lat = st.session_state.get('clicked_lat')
+    lon = st.session_state.get('clicked_lon')
+    if lat is None or lon is None:
         st.warning("Please select a location on the map page before calculating snow drift.")
+        return
+
+    st.write(f"Latitude: {lat:.6f}")
+    st.write(f"Longitude: {lon:.6f}")
+    grid_lat, grid_lon = snap_to_era5_grid(lat, lon)
+    st.write(f"Weather data from the ERA5 grid cell centred at latitude {grid_lat:.2f}, longitude {grid_lon:.2f}")
+    st.write("Please select the seasons (July to June) you want to calculate snow drift for.")
+
+    # Season selection, a season starts on July 1 of the selected year
+    start_year, end_year = st.slider(
+        "Select seasons (start year)",
+        min_value=2015,
+        max_value=2022,
+        value=(2021, 2022),
+        step=1,
+        key="snowdrift_years"
+    )
+
+    # Query Meteo
+    if st.button("Query Data"):
+        with st.spinner("Querying Meteo API..."):
+            # The last season runs into the following year, fetch all years in one archive request
+            st.session_state.weather_data = load_data_from_meteo_snow_range(start_year, end_year + 1, lat, lon)
+            st.success(f"Found {len(st.session_state.weather_data)} records")
+
+    if st.session_state.weather_data is not None:
+        # Only whole seasons, as in the site comparison and the regional calculation
+        df = sd.complete_seasons(st.session_state.weather_data, start_year, end_year)
+        if df.empty:
+            st.info("Query data for the selected seasons.")
+            return
+
+        # Parameters for the snow transport calculation.
+        T = 3000      # Maximum transport distance in meters
+        F = 30000     # Fetch distance in meters
+        theta = 0.5   # Relocation coefficient
+
+
+        # Reduce the weather to per-season totals and directional breakdown in one pass.
+        seasons, Swe, Qupot, season_sectors = sd.season_totals(df)
+        yearly_df = sd.seasonal_results(seasons, Swe, Qupot, T, F, theta)
+        overall_avg = yearly_df['Qt (kg/m)'].mean()
+        st.write(f"Overall average Qt over all seasons: {overall_avg / 1000:.1f} tonnes/m")
+        
+        yearly_df_disp = yearly_df.copy()
+        yearly_df_disp["Qt (tonnes/m)"] = yearly_df_disp["Qt (kg/m)"] / 1000
+        
+        # Average directional breakdown over all seasons.
+        avg_sectors = season_sectors.mean(axis=0)
         
+        # Create the rose plot canvas with the average directional breakdown.
+        fig = sd.plot_rose_plotly(avg_sectors, overall_avg)
+        st.plotly_chart(fig, use_container_width=True)
+
+        sensitivity(Swe, Qupot)
+
+def sensitivity(Swe, Qupot):
+    """Mean Qt and fence height over ranges of T, F and theta, from the seasonal totals."""
+    with st.expander("Parameter sensitivity"):
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            T_range = st.slider("T (m)", 500, 6000, (1000, 5000), step=100)
+        with col2:
+            F_range = st.slider("F (m)", 1000, 60000, (10000, 50000), step=1000)
+        with col3:
+            theta_range = st.slider("theta", 0.1, 1.0, (0.3, 0.7), step=0.05)
+        steps = st.slider("Values per parameter", 3, 30, 10)
+
+        sweep = sd.sensitivity_sweep(
+            Swe,
+            Qupot,
+            np.linspace(*T_range, steps),
+            np.linspace(*F_range, steps),
+            np.linspace(*theta_range, steps)
+        )
+        sweep["Qt (tonnes/m)"] = sweep["Qt (kg/m)"] / 1000
+
+        # One line per fence type against T, at the F and theta picked below
+        F_pick = st.select_slider("F for the chart (m)", options=sorted(sweep["F (m)"].unique()), format_func=lambda v: f"{v:.0f}")
+        theta_pick = st.select_slider("theta for the chart", options=sorted(sweep["theta"].unique()), format_func=lambda v: f"{v:.2f}")
+        chart = sweep[(sweep["F (m)"] == F_pick) & (sweep["theta"] == theta_pick)]
+        st.plotly_chart(px.line(chart, x="T (m)", y="H (m)", color="Fence type", hover_data=["Qt (tonnes/m)"]), use_container_width=True)
+        st.dataframe(sweep, use_container_width=True)
+
+def compare_sites():
+
+    st.subheader("Compare sites")
+    st.write("Edit the list of named sites and compare their seasonal snow transport.")
+
+    sites = st.data_editor(DEFAULT_SITES, num_rows="dynamic", use_container_width=True, key="sites")
+    start_year, end_year = st.slider(
+        "Select seasons (start year)",
+        min_value=2015,
+        max_value=2022,
+        value=(2021, 2022),
+        step=1,
+        key="site_years"
+    )
+    fence_type = st.selectbox("Fence type", list(sd.FENCE_FACTORS), key="site_fence_type")
+
+    if st.button("Compare sites"):
+        sites = sites.dropna()
+        named = {row['Site']: (row['Latitude'], row['Longitude']) for _, row in sites.iterrows()}
+        if not named:
+            st.error("Please enter at least one site")
+        else:
+            with st.spinner(f"Fetching and computing {len(named)} sites..."):
+                st.session_state.site_comparison = snowdrift_region.compare_sites(
+                    named, start_year, end_year, fence_type=fence_type
+                )
+
+    if st.session_state.site_comparison is not None:
+        comparison, sectors = st.session_state.site_comparison
+        st.dataframe(comparison, use_container_width=True, hide_index=True)
+
+        # Wind roses side by side, three per row
+        names = list(sectors)
+        for i in range(0, len(names), 3):
+            columns = st.columns(3)
+            for column, name in zip(columns, names[i:i + 3]):
+                Qt = comparison.loc[comparison['Site'] == name, 'Mean Qt (tonnes/m)'].iloc[0] * 1000
+                fig = sd.plot_rose_plotly(sectors[name], Qt)
+                fig.update_layout(title=name, width=None, height=350, margin=dict(l=30, r=30, t=50, b=30))
+                column.plotly_chart(fig, use_container_width=True)
+
+def regional_snowdrift():
+
+    st.subheader("Regional snowdrift")
+    st.write("Snow transport and the fence height needed to store it, for every ERA5 grid cell in a price area.")
+
+    areas = ['NO 1', 'NO 2', 'NO 3', 'NO 4', 'NO 5']
+    clicked_area = st.session_state.get('clicked_area')
+    area = st.selectbox("Price area", areas, index=areas.index(clicked_area) if clicked_area in areas else 0)
+    start_year, end_year = st.slider(
+        "Select seasons (start year)",
+        min_value=2015,
+        max_value=2022,
+        value=(2021, 2022),
+        step=1,
+        key="region_years"
+    )
+    fence_type = st.selectbox("Fence type", list(sd.FENCE_FACTORS))
+
+    if st.button("Calculate region"):
+        with st.spinner("Fetching weather and computing every grid cell..."):
+            st.session_state.region_results = snowdrift_region.compute_region(
+                snowdrift_region.area_geometry(area), start_year, end_year
+            )
+            st.success(f"Computed {len(st.session_state.region_results)} grid cells")
+
+    results = st.session_state.region_results
+    if results is not None and not results.empty:
+        column = st.radio("Show", ["Qt (tonnes/m)", f"H {fence_type} (m)"], horizontal=True)
+        colormap = cm.linear.YlOrRd_09.scale(results[column].min(), results[column].max())
+        colormap.caption = column
+
+        m = folium.Map(location=[results['latitude'].mean(), results['longitude'].mean()], zoom_start=6)
+        folium.GeoJson(
+            snowdrift_region.to_geojson(results),
+            style_function=lambda feature: {
+                'fillColor': colormap(feature['properties'][column]),
+                'color': 'none',
+                'fillOpacity': 0.7
+            },
+            tooltip=folium.GeoJsonTooltip(fields=['latitude', 'longitude', 'Qt (tonnes/m)', f'H {fence_type} (m)'])
+        ).add_to(m)
+        colormap.add_to(m)
+        st_folium(m, width=700, height=500, key="region_map", returned_objects=[])
 
 def snowdrift_page():
-    calculate_snowdrift()
\ No newline at end of file
+    calculate_snowdrift()
+    compare_sites()
+    regional_snowdrift()
\ No newline at end of file
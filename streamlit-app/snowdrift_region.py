@@ -0,0 +1,208 @@
+"""
+Snow drift over a region, evaluated on the ERA5 grid.
+
+Every ERA5 grid cell whose centre lies inside a price area polygon from
+data/energydata.geojson, or inside a bounding box, is evaluated with the same
+Tabler (2003) calculation as the Snowdrift page. Weather is read from the
+weather store and fetched in batches of cells when missing. The seasonal
+results are computed in parallel in a process pool, and the result is a
+GeoJSON FeatureCollection with one square per cell that folium can overlay.
+
+compare_sites() does the same for a handful of named sites, fetching each
+site's weather in its own thread while the process pool computes the others.
+
+Only complete seasons (July 1 of start_year to June 30 of end_year + 1) are used.
+
+Usage:
+    python snowdrift_region.py --area "NO 1" --start 2020 --end 2022 --out no1.geojson
+    python snowdrift_region.py --bbox 59.5 9.5 61.0 11.5 --start 2021 --end 2022 --out bbox.geojson
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from shapely.geometry import Point, box, shape
+
+import snowdrift_utilities as sd
+from load_data import ERA5_GRID_STEP, SNOW_COLUMNS, ensure_stored, snap_to_era5_grid, stored_view
+
+GEOJSON_PATH = Path(__file__).resolve().parent / "data" / "energydata.geojson"
+
+# Grid cells fetched in one archive request when they are not stored yet
+FETCH_BATCH = 50
+
+
+def area_geometry(price_area):
+    """Polygon of a price area ("NO 1" ... "NO 5") from the energydata GeoJSON."""
+    with open(GEOJSON_PATH, "r") as f:
+        features = json.load(f)["features"]
+    for feature in features:
+        if feature["properties"]["ElSpotOmr"] == price_area:
+            return shape(feature["geometry"])
+    raise ValueError(f"Unknown price area {price_area}")
+
+
+def bbox_geometry(south, west, north, east):
+    return box(west, south, east, north)
+
+
+def grid_cells(geometry, step=ERA5_GRID_STEP):
+    """Centres (latitude, longitude) of the ERA5 grid cells inside geometry."""
+    west, south, east, north = geometry.bounds
+    lats = np.arange(np.ceil(south / step), np.floor(north / step) + 1) * step
+    lons = np.arange(np.ceil(west / step), np.floor(east / step) + 1) * step
+    return [
+        (round(lat, 4), round(lon, 4))
+        for lat in lats for lon in lons
+        if geometry.contains(Point(lon, lat))
+    ]
+
+
+def _cell_result(cell, start_year, end_year, T, F, theta):
+    """Mean seasonal Qt and fence heights for one grid cell, read from the weather store."""
+    latitude, longitude = cell
+    df = stored_view(latitude, longitude, start_year, end_year + 1, SNOW_COLUMNS)
+    yearly_df, _ = sd.compute_all_seasons(sd.complete_seasons(df, start_year, end_year), T, F, theta)
+    Qt = float(yearly_df["Qt (kg/m)"].mean())
+    result = {
+        "latitude": latitude,
+        "longitude": longitude,
+        "Qt (tonnes/m)": Qt / 1000,
+        "Snowfall controlled seasons": int((yearly_df["Control"] == "Snowfall controlled").sum()),
+    }
+    for fence_type in sd.FENCE_FACTORS:
+        result[f"H {fence_type} (m)"] = sd.compute_fence_height(Qt, fence_type)
+    return result
+
+
+def compute_region(geometry, start_year, end_year, T=3000, F=30000, theta=0.5, workers=None):
+    """
+    Snow drift results for every ERA5 grid cell in geometry, as a DataFrame with
+    one row per cell. Missing weather is fetched first, FETCH_BATCH cells per request.
+    """
+    cells = grid_cells(geometry)
+    if not cells:
+        return pd.DataFrame()
+    for i in range(0, len(cells), FETCH_BATCH):
+        ensure_stored(cells[i:i + FETCH_BATCH], start_year, end_year + 1)
+
+    workers = workers or os.cpu_count()
+    # Spawned workers, forking a process running Streamlit is not safe
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        results = pool.map(
+            partial(_cell_result, start_year=start_year, end_year=end_year, T=T, F=F, theta=theta),
+            cells,
+            chunksize=max(1, len(cells) // (4 * workers)),
+        )
+        return pd.DataFrame(list(results))
+
+
+def _site_seasons(grid_cell, start_year, end_year, T, F, theta):
+    """Seasonal table and sector matrix for one ERA5 grid cell read from the weather store."""
+    df = stored_view(*grid_cell, start_year, end_year + 1, SNOW_COLUMNS)
+    return sd.compute_all_seasons(sd.complete_seasons(df, start_year, end_year), T, F, theta)
+
+
+def compare_sites(sites, start_year, end_year, T=3000, F=30000, theta=0.5, fence_type="Wyoming", workers=None):
+    """
+    Compute the seasonal snow transport for several named sites at once.
+    
+    Weather is fetched in threads, one site per thread, and each site is handed to a
+    process pool as soon as its weather is stored, so fetching and computing overlap
+    and the total time is close to that of the slowest site.
+    
+    Parameters:
+      sites: dict mapping a site name to (latitude, longitude)
+      start_year, end_year: first and last season start year, complete seasons only
+      T, F, theta: Tabler parameters as in sd.compute_snow_transport
+      fence_type: fence type for the fence height column
+      
+    Returns:
+      comparison: DataFrame with one row per site
+      sectors: dict mapping each site name to its 16 average sector values (kg/m)
+    """
+    grid_cells = {name: snap_to_era5_grid(latitude, longitude) for name, (latitude, longitude) in sites.items()}
+    unique_cells = set(grid_cells.values())
+    workers = workers or min(len(unique_cells), os.cpu_count())
+
+    seasons_by_cell = {}
+    # Spawned workers, forking a process running Streamlit is not safe
+    context = multiprocessing.get_context("spawn")
+    with ThreadPoolExecutor(max_workers=len(unique_cells)) as io_pool, \
+         ProcessPoolExecutor(max_workers=workers, mp_context=context) as compute_pool:
+        fetches = {io_pool.submit(ensure_stored, [cell], start_year, end_year + 1): cell for cell in unique_cells}
+        computations = {}
+        for fetch in as_completed(fetches):
+            fetch.result()
+            cell = fetches[fetch]
+            computations[compute_pool.submit(_site_seasons, cell, start_year, end_year, T, F, theta)] = cell
+        for computation in as_completed(computations):
+            seasons_by_cell[computations[computation]] = computation.result()
+
+    rows = []
+    sectors = {}
+    for name, (latitude, longitude) in sites.items():
+        yearly_df, season_sectors = seasons_by_cell[grid_cells[name]]
+        avg_sectors = season_sectors.mean(axis=0)
+        Qt = yearly_df['Qt (kg/m)'].mean()
+        sectors[name] = avg_sectors
+        rows.append({
+            "Site": name,
+            "Latitude": latitude,
+            "Longitude": longitude,
+            "Grid cell": f"{grid_cells[name][0]:.2f}, {grid_cells[name][1]:.2f}",
+            "Seasons": len(yearly_df),
+            "Mean Qt (tonnes/m)": Qt / 1000,
+            "Max Qt (tonnes/m)": yearly_df['Qt (kg/m)'].max() / 1000,
+            "Snowfall controlled seasons": int((yearly_df['Control'] == "Snowfall controlled").sum()),
+            "Main direction": sd.DIRECTIONS[int(np.argmax(avg_sectors))],
+            f"H {fence_type} (m)": sd.compute_fence_height(Qt, fence_type)
+        })
+    return pd.DataFrame(rows), sectors
+
+
+def to_geojson(results, step=ERA5_GRID_STEP):
+    """FeatureCollection with one grid cell square per row of compute_region results."""
+    features = []
+    for row in results.to_dict("records"):
+        half = step / 2
+        cell = box(row["longitude"] - half, row["latitude"] - half, row["longitude"] + half, row["latitude"] + half)
+        features.append({
+            "type": "Feature",
+            "geometry": cell.__geo_interface__,
+            "properties": {k: round(v, 3) if isinstance(v, float) else v for k, v in row.items()},
+        })
+    return {"type": "FeatureCollection", "features": features}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    region = parser.add_mutually_exclusive_group(required=True)
+    region.add_argument("--area", help='Price area, e.g. "NO 1"')
+    region.add_argument("--bbox", nargs=4, type=float, metavar=("SOUTH", "WEST", "NORTH", "EAST"))
+    parser.add_argument("--start", type=int, required=True, help="First season start year")
+    parser.add_argument("--end", type=int, required=True, help="Last season start year")
+    parser.add_argument("--T", type=float, default=3000, help="Maximum transport distance (m)")
+    parser.add_argument("--F", type=float, default=30000, help="Fetch distance (m)")
+    parser.add_argument("--theta", type=float, default=0.5, help="Relocation coefficient")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--out", type=Path, required=True, help="GeoJSON file to write")
+    args = parser.parse_args()
+
+    geometry = area_geometry(args.area) if args.area else bbox_geometry(*args.bbox)
+    results = compute_region(geometry, args.start, args.end, args.T, args.F, args.theta, args.workers)
+    with open(args.out, "w") as f:
+        json.dump(to_geojson(results), f)
+    print(f"{len(results)} grid cells written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -37,6 +37,10 @@ import matplotlib.pyplot as plt
 import streamlit as st
 import plotly.graph_objects as go
 
+# Wind rose sector labels, sector 0 is centred on north
+DIRECTIONS = ['N', 'NNE', 'NE', 'ENE', 'E', 'ESE', 'SE', 'SSE',
+              'S', 'SSW', 'SW', 'WSW', 'W', 'WNW', 'NW', 'NNW']
+
 def compute_Qupot(hourly_wind_speeds, dt=3600):
     """
     Compute the potential wind-driven snow transport (Qupot) [kg/m]
@@ -45,7 +49,8 @@ def compute_Qupot(hourly_wind_speeds, dt=3600):
     Formula:
        Qupot = sum((u^3.8) * dt) / 233847
     """
-    total = sum((u ** 3.8) * dt for u in hourly_wind_speeds) / 233847
+    u = np.asarray(hourly_wind_speeds, dtype=float)
+    total = float(np.sum((u ** 3.8) * dt)) / 233847
     return total
 
 def sector_index(direction):
@@ -56,6 +61,13 @@ def sector_index(direction):
     # Center the bin by adding 11.25° then modulo 360 and divide by 22.5°
     return int(((direction + 11.25) % 360) // 22.5)
 
+def sector_indices(directions):
+    """
+    Array version of sector_index: the sector (0-15) of every wind direction.
+    """
+    d = np.asarray(directions, dtype=float)
+    return (((d + 11.25) % 360) // 22.5).astype(np.intp)
+
 def compute_sector_transport(hourly_wind_speeds, hourly_wind_dirs, dt=3600):
     """
     Compute the cumulative transport for each of 16 wind sectors.
@@ -68,11 +80,10 @@ def compute_sector_transport(hourly_wind_speeds, hourly_wind_dirs, dt=3600):
     Returns:
       A list of 16 transport values (kg/m) corresponding to the sectors.
     """
-    sectors = [0.0] * 16
-    for u, d in zip(hourly_wind_speeds, hourly_wind_dirs):
-        idx = sector_index(d)
-        sectors[idx] += ((u ** 3.8) * dt) / 233847
-    return sectors
+    u = np.asarray(hourly_wind_speeds, dtype=float)
+    # bincount adds the hourly contributions per sector in order, like the loop it replaces
+    sectors = np.bincount(sector_indices(hourly_wind_dirs), weights=((u ** 3.8) * dt) / 233847, minlength=16)
+    return sectors.tolist()
 
 def compute_snow_transport(T, F, theta, Swe, hourly_wind_speeds, dt=3600):
     """
@@ -117,6 +128,124 @@ def compute_snow_transport(T, F, theta, Swe, hourly_wind_speeds, dt=3600):
         "Control": control
     }
 
+def season_ids(dates):
+    """
+    Season of every timestamp: the year the season starts in,
+    with seasons running from July 1 to June 30.
+    """
+    dates = pd.DatetimeIndex(dates)
+    return dates.year.to_numpy() - (dates.month.to_numpy() < 7)
+
+def season_totals(df, dt=3600):
+    """
+    Reduce hourly weather to per-season totals in one pass.
+    
+    Returns:
+      seasons: sorted array of season start years
+      Swe: total snowfall water equivalent per season (mm)
+      Qupot: potential wind-driven transport per season (kg/m)
+      sectors: array (seasons x 16) with the transport per wind sector (kg/m)
+    """
+    seasons, codes = np.unique(season_ids(df['date']), return_inverse=True)
+    n = len(seasons)
+    
+    # Hourly Swe: precipitation counts when temperature < +1°C.
+    precipitation = df['precipitation (mm)'].to_numpy(dtype=float)
+    Swe_hourly = np.where(df['temperature_2m (°C)'].to_numpy(dtype=float) < 1, precipitation, 0.0)
+    u = df["wind_speed_10m (m/s)"].to_numpy(dtype=float)
+    transport = ((u ** 3.8) * dt) / 233847
+    
+    Swe = np.bincount(codes, weights=Swe_hourly, minlength=n)
+    Qupot = np.bincount(codes, weights=transport, minlength=n)
+    cells = codes * 16 + sector_indices(df["wind_direction_10m (°)"])
+    sectors = np.bincount(cells, weights=transport, minlength=n * 16).reshape(n, 16)
+    return seasons, Swe, Qupot, sectors
+
+def compute_all_seasons(df, T, F, theta, dt=3600):
+    """
+    Compute the seasonal snow transport table and the directional breakdown
+    for every season in the data from a single grouped reduction.
+    
+    Returns:
+      yearly_df: DataFrame with one row per season, as compute_yearly_results
+      sectors: array (seasons x 16) with the transport per wind sector (kg/m),
+               rows in the same order as yearly_df
+    """
+    seasons, Swe, Qupot, sectors = season_totals(df, dt)
+    return seasonal_results(seasons, Swe, Qupot, T, F, theta), sectors
+
+def seasonal_results(seasons, Swe, Qupot, T, F, theta):
+    """
+    Seasonal snow transport table from the per-season totals of season_totals,
+    with one row per season, as compute_yearly_results.
+    """
+    Qspot = 0.5 * T * Swe  # Snowfall-limited transport [kg/m]
+    Srwe = theta * Swe    # Relocated water equivalent [mm]
+    snowfall_controlled = Qupot > Qspot
+    Qinf = np.where(snowfall_controlled, 0.5 * T * Srwe, Qupot)
+    Qt = Qinf * (1 - 0.14 ** (F / T))
+    
+    yearly_df = pd.DataFrame({
+        "Qupot (kg/m)": Qupot,
+        "Qspot (kg/m)": Qspot,
+        "Srwe (mm)": Srwe,
+        "Qinf (kg/m)": Qinf,
+        "Qt (kg/m)": Qt,
+        "Control": np.where(snowfall_controlled, "Snowfall controlled", "Wind controlled"),
+        "season": [f"{s}-{s+1}" for s in seasons]
+    })
+    return yearly_df
+
+def sensitivity_sweep(Swe, Qupot, T_values, F_values, theta_values, fence_types=None):
+    """
+    Mean seasonal Qt and required fence height for every combination of T, F, theta
+    and fence type, broadcast against the per-season totals of season_totals.
+    
+    Parameters:
+      Swe, Qupot: per-season totals (mm, kg/m)
+      T_values, F_values, theta_values: parameter values to combine
+      fence_types: fence types to include, all of FENCE_FACTORS by default
+      
+    Returns:
+      A tidy DataFrame with one row per (T, F, theta, fence type) and the columns
+      "T (m)", "F (m)", "theta", "Fence type", "Qt (kg/m)", "Snowfall controlled share", "H (m)".
+    """
+    fence_types = fence_types or list(FENCE_FACTORS)
+    # Axes: season, T, F, theta
+    Swe = np.asarray(Swe, dtype=float)[:, None, None, None]
+    Qupot = np.asarray(Qupot, dtype=float)[:, None, None, None]
+    T = np.asarray(T_values, dtype=float)[None, :, None, None]
+    F = np.asarray(F_values, dtype=float)[None, None, :, None]
+    theta = np.asarray(theta_values, dtype=float)[None, None, None, :]
+    
+    Qspot = 0.5 * T * Swe
+    snowfall_controlled = Qupot > Qspot
+    Qinf = np.where(snowfall_controlled, 0.5 * T * theta * Swe, Qupot)
+    Qt = (Qinf * (1 - 0.14 ** (F / T))).mean(axis=0)
+    controlled_share = np.broadcast_to(snowfall_controlled.mean(axis=0), Qt.shape)
+    
+    grid = pd.MultiIndex.from_product([T_values, F_values, theta_values], names=["T (m)", "F (m)", "theta"])
+    base = grid.to_frame(index=False)
+    base["Qt (kg/m)"] = Qt.ravel()
+    base["Snowfall controlled share"] = controlled_share.ravel()
+    
+    frames = []
+    for fence_type in fence_types:
+        frame = base.copy()
+        frame.insert(3, "Fence type", fence_type)
+        frame["H (m)"] = compute_fence_height(frame["Qt (kg/m)"], fence_type)
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
+
+def complete_seasons(df, start_year, end_year):
+    """
+    Rows of df in the complete seasons starting in start_year to end_year,
+    from July 1 of start_year to June 30 of end_year + 1, with naive dates.
+    """
+    dates = df['date'].dt.tz_localize(None)
+    keep = (dates >= pd.Timestamp(start_year, 7, 1)) & (dates < pd.Timestamp(end_year + 1, 7, 1))
+    return df[keep].assign(date=dates[keep])
+
 def compute_yearly_results(df, T, F, theta):
     """
     Compute the yearly (seasonal) snow transport parameters for every season in the data.
@@ -124,42 +253,16 @@ def compute_yearly_results(df, T, F, theta):
     
     Returns a DataFrame with one row per season.
     """
-    seasons = sorted(df['season'].unique())
-    results_list = []
-    for s in seasons:
-        season_start = pd.Timestamp(year=s, month=7, day=1)
-        season_end = pd.Timestamp(year=s+1, month=6, day=30, hour=23, minute=59, second=59)
-        df_season = df[(df['date'] >= season_start) & (df['date'] <= season_end)]
-        if df_season.empty:
-            continue
-        # Calculate hourly Swe: precipitation counts when temperature < +1°C.
-        df_season = df_season.copy()  # avoid SettingWithCopyWarning
-        df_season['Swe_hourly'] = df_season.apply(
-            lambda row: row['precipitation (mm)'] if row['temperature_2m (°C)'] < 1 else 0, axis=1)
-        total_Swe = df_season['Swe_hourly'].sum()
-        wind_speeds = df_season["wind_speed_10m (m/s)"].tolist()
-        result = compute_snow_transport(T, F, theta, total_Swe, wind_speeds)
-        result["season"] = f"{s}-{s+1}"
-        results_list.append(result)
-    return pd.DataFrame(results_list)
+    yearly_df, _ = compute_all_seasons(df, T, F, theta)
+    return yearly_df
 
 def compute_average_sector(df):
     """
     Compute the average directional breakdown (sectors) over all seasons.
-    The function groups the data by season and computes the sector contributions
-    for each season, then returns the mean across seasons.
-    """
-    sectors_list = []
-    for s, group in df.groupby('season'):
-        group = group.copy()
-        group['Swe_hourly'] = group.apply(
-            lambda row: row['precipitation (mm)'] if row['temperature_2m (°C)'] < 1 else 0, axis=1)
-        ws = group["wind_speed_10m (m/s)"].tolist()
-        wdir = group["wind_direction_10m (°)"].tolist()
-        sectors = compute_sector_transport(ws, wdir)
-        sectors_list.append(sectors)
-    avg_sectors = np.mean(sectors_list, axis=0)
-    return avg_sectors
+    The sector contributions are computed for each season, then averaged across seasons.
+    """
+    _, _, _, sectors = season_totals(df)
+    return sectors.mean(axis=0)
 
 def plot_rose(avg_sector_values, overall_avg):
     """
@@ -256,38 +359,34 @@ def plot_rose_plotly(avg_sector_values, overall_avg):
     return fig
 
 
+# Storage capacity factor (Qc/H^2.2) per fence type, Table 3.3
+FENCE_FACTORS = {"Wyoming": 8.5, "Slat-and-wire": 7.7, "Solid": 2.9}
+
 def compute_fence_height(Qt, fence_type):
     """
     Calculate the necessary effective fence height (H) for storing a given snow drift.
     
     Parameters:
-      Qt : float
+      Qt : float or array
            The calculated mean annual snow transport (drift) in kg/m.
       fence_type : str
-           The fence type. Supported types are:
-           "Wyoming", "Slat-and-wire", and "Solid".
+           The fence type, one of FENCE_FACTORS: "Wyoming", "Slat-and-wire"
+           or "Solid" (case-insensitive, "slat and wire" is also accepted).
     
     Returns:
-      H : float
+      H : float or array
           The necessary effective fence height (in meters).
     
     Calculation:
       1. Convert Qt from kg/m to tonnes/m (divide by 1000).
-      2. Use the storage capacity factor for the selected fence type:
-             - Wyoming: 8.5
-             - Slat-and-wire: 7.7
-             - Solid: 2.9
+      2. Use the storage capacity factor of the fence type from FENCE_FACTORS.
       3. Calculate H = ( (Qt_tonnes) / (factor) )^(1/2.2)
     """
-    Qt_tonnes = Qt / 1000.0
-    if fence_type.lower() == "wyoming":
-        factor = 8.5
-    elif fence_type.lower() in ["slat-and-wire", "slat and wire"]:
-        factor = 7.7
-    elif fence_type.lower() == "solid":
-        factor = 2.9
-    else:
-        raise ValueError("Unsupported fence type. Choose 'Wyoming', 'Slat-and-wire', or 'Solid'.")
+    factors = {name.lower(): factor for name, factor in FENCE_FACTORS.items()}
+    name = fence_type.lower().replace(" ", "-")
+    if name not in factors:
+        raise ValueError(f"Unsupported fence type. Choose one of {', '.join(FENCE_FACTORS)}.")
     
-    H = (Qt_tonnes / factor) ** (1 / 2.2)
+    Qt_tonnes = Qt / 1000.0
+    H = (Qt_tonnes / factors[name]) ** (1 / 2.2)
     return H
@@ -0,0 +1,169 @@
+"""
+Batch SPC outlier detection for the hourly weather series.
+
+The outlier page high-pass filters a series with a DCT, and flags the hours
+whose high-passed value lies more than k median absolute deviations from the
+median. Here many series are stacked into one 2-D array (one row per
+variable, city and year) and filtered with a single dct/idct call along the
+time axis, with the median and MAD computed per row.
+
+precompute() runs every variable, city and year at once and saves the result
+as one Parquet file per city and year, so the page only has to read and plot.
+Run it nightly with:
+    python spc_engine.py --start 2018 --end 2024
+"""
+
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy.fft import dct, idct
+
+from load_data import CITIES, city_locations, load_weather
+
+RESULTS_DIR = Path(__file__).resolve().parent / ".spc_results"
+
+# Wind direction is circular, a DCT high-pass of it is meaningless
+SPC_VARIABLES = ["temperature_2m", "precipitation", "wind_speed_10m", "wind_gusts_10m"]
+
+
+def dct_coefficients(X):
+    """DCT of every row of X (series x hours). Computed once, it serves every cutoff."""
+    return dct(np.asarray(X, dtype=float), axis=1, norm='ortho')
+
+
+def highpass_filter(coefficients, cutoff):
+    """Rows of the series behind coefficients with the lowest cutoff DCT coefficients removed."""
+    coefficients = coefficients.copy()
+    coefficients[:, :cutoff] = 0
+    return idct(coefficients, axis=1, norm='ortho')
+
+
+def robust_center(highpass):
+    """Median and median absolute deviation of every row. They do not depend on k."""
+    median = np.median(highpass, axis=1)
+    mad = np.median(np.abs(highpass - median[:, None]), axis=1)
+    return median, mad
+
+
+def spc_batch(X, cutoff=100, k=3.0):
+    """
+    SPC limits for every row of X (series x hours).
+
+    Returns a dict of arrays:
+      highpass, seasonal: same shape as X
+      median, mad, upper, lower: one value per row, limits on the high-passed series
+      is_outlier: boolean mask, same shape as X
+    """
+    X = np.asarray(X, dtype=float)
+    highpass = highpass_filter(dct_coefficients(X), cutoff)
+    median, mad = robust_center(highpass)
+    return spc_limits(X, highpass, median, mad, k)
+
+
+def spc_limits(X, highpass, median, mad, k=3.0):
+    """spc_batch results from an already filtered X and its median and MAD, for any k."""
+    upper = median + k * mad
+    lower = median - k * mad
+    is_outlier = (highpass > upper[:, None]) | (highpass < lower[:, None])
+    return {
+        'highpass': highpass,
+        'seasonal': X - highpass,
+        'median': median,
+        'mad': mad,
+        'upper': upper,
+        'lower': lower,
+        'is_outlier': is_outlier,
+    }
+
+
+def spc_series(values, cutoff=100, k=3.0):
+    """
+    SPC results for a dict of 1-D series of any lengths. Series of equal length
+    are stacked and filtered together. Returns a dict with the same keys, each
+    value a dict like spc_batch for a single row.
+    """
+    by_length = {}
+    for key, series in values.items():
+        by_length.setdefault(len(series), []).append(key)
+
+    results = {}
+    for keys in by_length.values():
+        batch = spc_batch(np.vstack([values[key] for key in keys]), cutoff, k)
+        for i, key in enumerate(keys):
+            results[key] = {name: array[i] for name, array in batch.items()}
+    return results
+
+
+def spc_frame(df, column, cutoff=100, k=3.0):
+    """
+    Single series version for the page: a copy of df with the columns
+    temp_highpass, seasonal, ucl, lcl and is_outlier for the given column.
+    """
+    result = spc_series({column: df[column].to_numpy()}, cutoff, k)[column]
+    df = df.copy()
+    df['temp_highpass'] = result['highpass']
+    df['seasonal'] = result['seasonal']
+    df['ucl'] = df['seasonal'] + result['upper']
+    df['lcl'] = df['seasonal'] + result['lower']
+    df['is_outlier'] = result['is_outlier']
+    return df
+
+
+def results_path(city, year, cutoff, k):
+    return RESULTS_DIR / f"{city}_{year}_c{cutoff}_k{k:g}.parquet"
+
+
+def load_results(city, year, cutoff=100, k=3.0):
+    """
+    Precomputed SPC results for a city and year, or None when precompute() has not
+    been run with these parameters. Columns: date and, for every variable,
+    <variable>_seasonal, <variable>_ucl, <variable>_lcl and <variable>_is_outlier.
+    """
+    path = results_path(city, year, cutoff, k)
+    if not path.exists():
+        return None
+    return pd.read_parquet(path)
+
+
+def precompute(start_year, end_year, cutoff=100, k=3.0):
+    """Run SPC for every variable, city and year in one batch and save one file per city and year."""
+    frames = dict(zip(CITIES, load_weather(city_locations(), start_year, end_year)))
+    values = {}
+    dates = {}
+    for city, df in frames.items():
+        for year, rows in df.groupby(df['date'].dt.year):
+            dates[(city, year)] = rows['date']
+            for variable in SPC_VARIABLES:
+                values[(variable, city, year)] = rows[variable].to_numpy()
+
+    results = spc_series(values, cutoff, k)
+
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    for (city, year), year_dates in dates.items():
+        columns = {'date': year_dates.to_numpy()}
+        for variable in SPC_VARIABLES:
+            r = results[(variable, city, year)]
+            columns[f'{variable}_seasonal'] = r['seasonal']
+            columns[f'{variable}_ucl'] = r['seasonal'] + r['upper']
+            columns[f'{variable}_lcl'] = r['seasonal'] + r['lower']
+            columns[f'{variable}_is_outlier'] = r['is_outlier']
+        pd.DataFrame(columns).to_parquet(results_path(city, year, cutoff, k), index=False)
+    return len(values)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--start", type=int, required=True)
+    parser.add_argument("--end", type=int, required=True)
+    parser.add_argument("--cutoff", type=int, default=100, help="Number of low DCT coefficients removed")
+    parser.add_argument("--k", type=float, default=3.0, help="Number of MADs between the median and the limits")
+    args = parser.parse_args()
+
+    n = precompute(args.start, args.end, args.cutoff, args.k)
+    print(f"SPC computed for {n} series, saved in {RESULTS_DIR}")
+
+
+if __name__ == "__main__":
+    main()
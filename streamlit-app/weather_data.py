@@ -2,6 +2,7 @@ import streamlit as st
 import altair as alt
 import pandas as pd
 from load_data import load_data, load_data_from_meteo
+from frame_schema import to_chart_frame
 
 def month_slicer(df):
 
@@ -60,6 +61,9 @@ def plotter(selected_column, column_options, df):
     Plot the selceted months and columns
     """
 
+    # Widen the float32 columns for Altair
+    df = to_chart_frame(df)
+
     if selected_column == "All columns":
         # Melt the DataFrame for Altair
         melted = df.melt(id_vars='time', value_vars=column_options[1:], var_name='Series', value_name='Value')
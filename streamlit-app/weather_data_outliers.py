@@ -3,16 +3,20 @@ import pandas as pd
 import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
-from scipy.fft import dct, idct
-from sklearn.neighbors import LocalOutlierFactor
 from load_data import load_data_from_meteo
+from frame_schema import to_chart_frame
+from spc_engine import dct_coefficients, highpass_filter, load_results, robust_center, spc_frame, spc_limits
+from lof_1d import lof_fit_predict, lof_labels
+from online_outliers import OnlineStream
 
-def plot_summary_satv(df, cutoff=100, k=3.0):
+def plot_summary_satv(df, cutoff=100, k=3.0, spc=None):
     """
     Input:
     df : pd.DataFrame
     cutoff : int
     k : float
+    spc : pd.DataFrame, precomputed results from spc_engine.load_results,
+          computed here when None
 
     Returns
     -------
@@ -20,25 +24,16 @@ def plot_summary_satv(df, cutoff=100, k=3.0):
     summary : pd.DataFrame
     """
 
-    df = df.copy()
+    df = to_chart_frame(df)
 
-    # High pass filtering
-    temp_dct_ortho = dct(df['temperature_2m'], norm='ortho')
-    temp_dct_ortho[:cutoff] = 0
-    df['temp_highpass'] = idct(temp_dct_ortho, norm='ortho')
-    df['seasonal'] = df['temperature_2m'] - df['temp_highpass']
-
-    # Seasonally adjusted temperature variations
-    median_satv = np.median(df['temp_highpass'])
-    mad_satv = np.median(np.abs(df['temp_highpass'] - median_satv))
-    upper_satv = median_satv + k * mad_satv
-    lower_satv = median_satv - k * mad_satv
-
-    df['ucl'] = df['seasonal'] + upper_satv
-    df['lcl'] = df['seasonal'] + lower_satv
-
-    # Add outliers to df
-    df['is_outlier'] = (df['temp_highpass'] > upper_satv) | (df['temp_highpass'] < lower_satv)
+    if spc is None:
+        # DCT high-pass and MAD limits on the seasonally adjusted temperature
+        df = spc_frame(df, 'temperature_2m', cutoff, k)
+    else:
+        df['seasonal'] = spc['temperature_2m_seasonal'].to_numpy()
+        df['ucl'] = spc['temperature_2m_ucl'].to_numpy()
+        df['lcl'] = spc['temperature_2m_lcl'].to_numpy()
+        df['is_outlier'] = spc['temperature_2m_is_outlier'].to_numpy()
 
     # Plotting
     fig = go.Figure()
@@ -113,11 +108,13 @@ def plot_summary_satv(df, cutoff=100, k=3.0):
 
     return fig, summary
 
-def plot_precip_anomalies(df, outlier_fraction=0.01):
+def plot_precip_anomalies(df, outlier_fraction=0.01, negative_outlier_factor=None):
     """
     Input:
     df : pd.DataFrame
     outlier_fraction : float
+    negative_outlier_factor : np.ndarray, LOF scores of the precipitation,
+                              computed here when None
 
     Returns
     -------
@@ -125,15 +122,14 @@ def plot_precip_anomalies(df, outlier_fraction=0.01):
     summary : pd.DataFrame
     """
     
-    df = df.copy()
+    df = to_chart_frame(df)
     df["date"] = pd.to_datetime(df["date"])
 
-    # Feature for anomaly detection
-    X = df[["precipitation"]].values
-
-    # Local Outlier Factor
-    lof = LocalOutlierFactor(n_neighbors=20, contamination=outlier_fraction)
-    labels = lof.fit_predict(X)
+    # Local Outlier Factor, neighbours found from the sorted values
+    if negative_outlier_factor is None:
+        labels, _ = lof_fit_predict(df["precipitation"].to_numpy(), n_neighbors=20, contamination=outlier_fraction)
+    else:
+        labels = lof_labels(negative_outlier_factor, outlier_fraction)
     df["anomaly"] = labels == -1
     anomalies = df[df["anomaly"]]
 
@@ -178,6 +174,105 @@ def plot_precip_anomalies(df, outlier_fraction=0.01):
     return fig, summary
 
 
+# Cached per session: a few city and year combinations, and a few parameter settings of each
+DATA_CACHE_ENTRIES = 8
+RESULT_CACHE_ENTRIES = 32
+
+@st.cache_data(max_entries=DATA_CACHE_ENTRIES, show_spinner=False)
+def _temperature_spectrum(city, year):
+    """Temperature and its DCT coefficients, shared by every cutoff"""
+    temperature = load_data_from_meteo(year, city)['temperature_2m'].to_numpy(dtype=float)[None]
+    return temperature, dct_coefficients(temperature)
+
+@st.cache_data(max_entries=RESULT_CACHE_ENTRIES, show_spinner=False)
+def _temperature_highpass(city, year, cutoff):
+    """High-passed temperature with its median and MAD, shared by every k"""
+    _, coefficients = _temperature_spectrum(city, year)
+    highpass = highpass_filter(coefficients, cutoff)
+    median, mad = robust_center(highpass)
+    return highpass, median, mad
+
+@st.cache_data(max_entries=DATA_CACHE_ENTRIES, show_spinner=False)
+def _precipitation_lof(city, year, n_neighbors=20):
+    """LOF scores of the precipitation, shared by every outlier fraction"""
+    precipitation = load_data_from_meteo(year, city)['precipitation'].to_numpy(dtype=float)
+    return lof_fit_predict(precipitation, n_neighbors)[1]
+
+@st.cache_data(max_entries=RESULT_CACHE_ENTRIES, show_spinner="Running SPC analysis...")
+def spc_analysis(city, year, cutoff=100, k=3.0):
+    """SPC figure and summary, from the precomputed results of spc_engine when available"""
+    df = load_data_from_meteo(year, city)
+    spc = load_results(city, year, cutoff, k)
+    if spc is None:
+        temperature, _ = _temperature_spectrum(city, year)
+        highpass, median, mad = _temperature_highpass(city, year, cutoff)
+        result = spc_limits(temperature, highpass, median, mad, k)
+        spc = pd.DataFrame({
+            'temperature_2m_seasonal': result['seasonal'][0],
+            'temperature_2m_ucl': result['seasonal'][0] + result['upper'][0],
+            'temperature_2m_lcl': result['seasonal'][0] + result['lower'][0],
+            'temperature_2m_is_outlier': result['is_outlier'][0],
+        })
+    return plot_summary_satv(df, cutoff, k, spc=spc)
+
+@st.cache_data(max_entries=RESULT_CACHE_ENTRIES, show_spinner="Running LOF analysis...")
+def lof_analysis(city, year, outlier_fraction=0.01):
+    """LOF figure and summary"""
+    df = load_data_from_meteo(year, city)
+    return plot_precip_anomalies(df, outlier_fraction, negative_outlier_factor=_precipitation_lof(city, year))
+
+
+def plot_online_outliers(results):
+    """
+    Input:
+    results : pd.DataFrame, OnlineStream.frame()
+
+    Returns
+    -------
+    fig_temperature, fig_precipitation : plotly.graph_objects.Figure
+    summary : pd.DataFrame
+    """
+
+    temperature_outliers = results[results['temperature_outlier']]
+    precipitation_outliers = results[results['precipitation_outlier']]
+
+    fig_temperature = go.Figure()
+    fig_temperature.add_trace(go.Scatter(x=results['date'], y=results['temperature_2m'], mode='lines', name='Temperature'))
+    fig_temperature.add_trace(go.Scatter(
+        x=results['date'], y=results['seasonal'], mode='lines', name='Online seasonal baseline',
+        line=dict(color='green', dash='dash')
+    ))
+    fig_temperature.add_trace(go.Scatter(
+        x=temperature_outliers['date'], y=temperature_outliers['temperature_2m'], mode='markers', name='Outliers',
+        marker=dict(color='red', size=4, symbol='circle')
+    ))
+    fig_temperature.update_layout(
+        title='Temperature with online robust z-score outliers',
+        xaxis_title='Date', yaxis_title='Temperature (°C)', template='plotly_white'
+    )
+
+    fig_precipitation = go.Figure()
+    fig_precipitation.add_trace(go.Scatter(
+        x=results['date'], y=results['precipitation'], mode='lines', name='Normal', line=dict(color='blue')
+    ))
+    fig_precipitation.add_trace(go.Scatter(
+        x=precipitation_outliers['date'], y=precipitation_outliers['precipitation'], mode='markers', name='Anomaly',
+        marker=dict(color='red', size=4, symbol='circle')
+    ))
+    fig_precipitation.update_layout(
+        title='Precipitation with online density anomalies',
+        xaxis_title='Date-Time', yaxis_title='Precipitation', template='plotly_white'
+    )
+
+    summary = pd.DataFrame([{
+        'Hours Seen': len(results),
+        'Last Hour': results['date'].max(),
+        'Temperature Outliers': int(results['temperature_outlier'].sum()),
+        'Precipitation Anomalies': int(results['precipitation_outlier'].sum()),
+    }])
+
+    return fig_temperature, fig_precipitation, summary
+
 
 def weather_data_outliers_page():
     
@@ -187,7 +282,8 @@ def weather_data_outliers_page():
     st.write("If you made a selection on the Weather data page, this selection will be reflected on this page.")
     st.write("Please choose which plot you want to see below.")
 
-    tab1, tab2 = st.tabs(["SPC analysis", "LOF analysis"])
+    # Only the chosen analysis is computed, unlike st.tabs which runs every tab
+    method = st.radio("Analysis", ["SPC analysis", "LOF analysis", "Online detection"], horizontal=True)
 
     if 'selected_year' not in st.session_state:
         st.session_state.selected_year = 2021
@@ -206,23 +302,43 @@ def weather_data_outliers_page():
     else:
         st.warning("Please select a city on the second page first")
 
-    # Load data
-    df = load_data_from_meteo(st.session_state.selected_year, st.session_state.selected_city)
-    
-    # Content for Tab 1
-    with tab1:
+    if method == "SPC analysis":
         st.header("SPC analysis")
         st.write(f"Using data from year: {st.session_state.selected_year}")
         st.write(f"Using data from city: {st.session_state.selected_city}")
-        fig, summary = plot_summary_satv(df)
+        col1, col2 = st.columns(2)
+        with col1:
+            cutoff = st.slider("DCT cutoff (low frequency coefficients removed)", 10, 500, 100, step=10)
+        with col2:
+            k = st.slider("k (MADs between the median and the limits)", 1.0, 6.0, 3.0, step=0.5)
+        # The DCT is shared by every cutoff, and the filtered series by every k
+        fig, summary = spc_analysis(st.session_state.selected_city, st.session_state.selected_year, cutoff, k)
         st.plotly_chart(fig)
         st.write(summary.head())
 
-    # Content for Tab 2
-    with tab2:
+    elif method == "LOF analysis":
         st.header("LOF analysis")
         st.write(f"Using data from year: {st.session_state.selected_year}")
-        st.write(f"Using data from city: {st.session_state.selected_year}")
-        fig, summary = plot_precip_anomalies(df)
+        st.write(f"Using data from city: {st.session_state.selected_city}")
+        outlier_fraction = st.slider("Expected share of outliers", 0.001, 0.05, 0.01, step=0.001, format="%.3f")
+        # The LOF scores are shared by every outlier fraction
+        fig, summary = lof_analysis(st.session_state.selected_city, st.session_state.selected_year, outlier_fraction)
         st.plotly_chart(fig)
+        st.write(summary)
+
+    else:
+        st.header("Online detection")
+        st.write("Hour by hour detection that keeps its state between refreshes, so only newly arrived hours are processed.")
+        df = load_data_from_meteo(st.session_state.selected_year, st.session_state.selected_city)
+        if 'online_streams' not in st.session_state:
+            st.session_state.online_streams = {}
+        key = (st.session_state.selected_city, st.session_state.selected_year)
+        if key not in st.session_state.online_streams:
+            st.session_state.online_streams[key] = OnlineStream()
+        stream = st.session_state.online_streams[key]
+        new_hours = stream.append(df)
+        st.write(f"{new_hours} new hours processed")
+        fig_temperature, fig_precipitation, summary = plot_online_outliers(stream.frame())
+        st.plotly_chart(fig_temperature)
+        st.plotly_chart(fig_precipitation)
         st.write(summary)
\ No newline at end of file
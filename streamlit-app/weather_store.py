@@ -0,0 +1,116 @@
+"""
+On-disk store for decoded ERA5 hourly weather.
+
+Each (latitude, longitude, year) is kept as one float32 .npy array with one
+column per hourly variable, next to a small JSON file with the time axis and
+the time it was fetched. Arrays are loaded with mmap, so reading a stored
+year does not copy it.
+
+ERA5 history does not change, so a year fetched after it was complete is
+kept forever. Years that were still running when fetched are refreshed after
+CURRENT_YEAR_TTL seconds.
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+STORE_DIR = Path(__file__).resolve().parent / ".weather_store"
+
+# Seconds before a year that was incomplete when fetched is downloaded again
+CURRENT_YEAR_TTL = 3600
+
+# ERA5 is published with a delay of about five days, a year counts as
+# complete when it was fetched after this day of the following year
+COMPLETE_AFTER = (1, 15)
+
+
+def _location_dir(latitude, longitude):
+    return STORE_DIR / f"lat{latitude:+08.4f}_lon{longitude:+09.4f}"
+
+
+def _paths(latitude, longitude, year):
+    directory = _location_dir(latitude, longitude)
+    return directory / f"{year}.npy", directory / f"{year}.json"
+
+
+def _is_complete(year, fetched_at):
+    month, day = COMPLETE_AFTER
+    complete_from = datetime(year + 1, month, day, tzinfo=timezone.utc).timestamp()
+    return fetched_at >= complete_from
+
+
+def _read_meta(latitude, longitude, year):
+    _, meta_path = _paths(latitude, longitude, year)
+    if not meta_path.exists():
+        return None
+    with open(meta_path, "r") as f:
+        return json.load(f)
+
+
+def is_fresh(latitude, longitude, year, variables):
+    """True when the year is stored with all variables and does not need a refresh."""
+    meta = _read_meta(latitude, longitude, year)
+    if meta is None or not set(variables) <= set(meta["variables"]):
+        return False
+    if _is_complete(year, meta["fetched_at"]):
+        return True
+    return time.time() - meta["fetched_at"] < CURRENT_YEAR_TTL
+
+
+def write(latitude, longitude, year, dates, arrays):
+    """
+    Store one year of hourly data for a location.
+
+    dates: DatetimeIndex with a fixed hourly interval
+    arrays: dict mapping variable name to a 1-D array aligned with dates
+    """
+    array_path, meta_path = _paths(latitude, longitude, year)
+    array_path.parent.mkdir(parents=True, exist_ok=True)
+    variables = list(arrays)
+    # Column-major, so every variable is a contiguous slice of the memory map
+    values = np.asfortranarray(np.column_stack([np.asarray(arrays[v], dtype="float32") for v in variables]))
+    interval = dates[1] - dates[0] if len(dates) > 1 else pd.Timedelta(hours=1)
+    meta = {
+        "variables": variables,
+        "start": int(dates[0].timestamp()),
+        "interval": int(interval.total_seconds()),
+        "length": len(dates),
+        "fetched_at": time.time(),
+    }
+
+    # Write to temporary files and move them into place, the array before its metadata
+    suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+    array_tmp = array_path.with_name(array_path.name + suffix)
+    meta_tmp = meta_path.with_name(meta_path.name + suffix)
+    with open(array_tmp, "wb") as f:
+        np.save(f, values)
+    with open(meta_tmp, "w") as f:
+        json.dump(meta, f)
+    os.replace(array_tmp, array_path)
+    os.replace(meta_tmp, meta_path)
+
+
+def read(latitude, longitude, year, variables):
+    """
+    Return (dates, arrays) for a stored year, with arrays as read-only
+    memory-mapped views without copying, or None when the year is not stored.
+    """
+    meta = _read_meta(latitude, longitude, year)
+    if meta is None:
+        return None
+    array_path, _ = _paths(latitude, longitude, year)
+    values = np.load(array_path, mmap_mode="r")
+    dates = pd.date_range(
+        start=pd.to_datetime(meta["start"], unit="s", utc=True),
+        periods=meta["length"],
+        freq=pd.Timedelta(seconds=meta["interval"]),
+    )
+    columns = {name: i for i, name in enumerate(meta["variables"])}
+    return dates, {v: values[:, columns[v]] for v in variables}